@@ -0,0 +1,305 @@
+import hashlib
+import io
+import json
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from pygame import image, Surface
+from pygame.font import Font
+from pygame.mixer import Sound
+from pygame.transform import smoothscale, flip
+
+from bundle import AssetBundle
+from consts import *
+
+
+def variant_name(path: str | Path, size: tuple[int, int] | None, flip_x: bool) -> str:
+    # Manifest key of an image variant, e.g. "title_screen/arrow.png@51x20+flip"
+    name = Path(path).as_posix()
+    if size is not None:
+        name += f"@{size[0]}x{size[1]}"
+    if flip_x:
+        name += "+flip"
+    return name
+
+
+class AssetRegistry:
+    # Loads every image and sound exactly once and hands the same object to every sprite that asks for it.
+    # Images are keyed by (path, size, flip, alpha) and sounds by (path, volume), where path is relative to ASSETS_DIR.
+    # Files come from the packed bundle when one is given (see USE_ASSET_BUNDLE), and from the loose files in
+    # ASSETS_DIR otherwise.
+    # Scaled and flipped images are read straight from the output of src/bake.py when it has been run and
+    # their source art hasn't changed since.
+    # Examples: registry.image("knight/standing.png", (64, 64))
+    #           registry.image("title_screen/arrow.png", (51, 20), flip_x=True)
+    #           registry.sound("sounds/button/arrow_up.ogg", 0.5)
+    #           pygame.mixer.music.load(registry.music("music/gameplay.ogg"), "gameplay.ogg")
+    def __init__(self, bundle: AssetBundle | None = None):
+        self.bundle = bundle
+        self.surfaces: dict[tuple, Surface] = {}
+        self.sounds: dict[tuple, Sound] = {}
+        self.sound_lists: dict[tuple, list[Sound]] = {}
+        self.music_files: dict[str, bytes] = {}
+        # The image() key each loaded surface was cached under, for resized(), and the keys resized() itself
+        # asked for, which are copies at another size rather than art the game uses directly
+        self.surface_keys: weakref.WeakKeyDictionary[Surface, tuple] = weakref.WeakKeyDictionary()
+        self.resized_keys: set[tuple] = set()
+        self.fonts: dict[tuple, Font] = {}
+        self.baked: dict[str, dict] | None = None
+        # SHA-1 of each source file a baked variant was looked up for, by path
+        self.source_hashes: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    def open(self, path: str | Path) -> Path | io.BytesIO:
+        # Something pygame's loaders accept: a file-like object from the bundle or a path to the loose file
+        if self.bundle is not None:
+            return self.bundle.open(path)
+        return ASSETS_DIR / path
+
+    def read(self, path: str | Path) -> bytes:
+        if self.bundle is not None:
+            return bytes(self.bundle.read(path))
+        return (ASSETS_DIR / path).read_bytes()
+
+    def exists(self, path: str | Path) -> bool:
+        if self.bundle is not None:
+            return path in self.bundle
+        return (ASSETS_DIR / path).is_file()
+
+    def listdir(self, directory: str | Path, suffix: str) -> list[str]:
+        if self.bundle is not None:
+            return self.bundle.listdir(directory, suffix)
+        return sorted(path.relative_to(ASSETS_DIR).as_posix() for path in (ASSETS_DIR / directory).glob(f"*{suffix}"))
+
+    def image(
+        self,
+        path: str | Path,
+        size: tuple[int, int] | None = None,
+        flip_x: bool = False,
+        alpha: bool = True,
+    ) -> Surface:
+        key = (Path(path).as_posix(), size, flip_x, alpha)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        start = time.perf_counter()
+        baked = self.baked_variants().get(variant_name(path, size, flip_x))
+        if baked is not None and baked["source_sha1"] == self.source_sha1(path):
+            surf = image.load(self.open(baked["file"]), baked["file"])
+            surf = surf.convert_alpha() if alpha else surf.convert()
+        else:
+            surf = self.render_variant(path, size, flip_x, alpha)
+        self.load_time += time.perf_counter() - start
+
+        self.surfaces[key] = surf
+        self.surface_keys[surf] = key
+        return surf
+
+    def resized(self, surf: Surface, size: tuple[int, int]) -> Surface:
+        # surf at another size. Images from image() are loaded again at that size the same way, so they come
+        # from the source art (or a baked variant) and are cached; any other surface, e.g. rendered text, is
+        # smoothscaled.
+        key = self.surface_keys.get(surf)
+        if key is None:
+            return smoothscale(surf, size)
+        path, _, flip_x, alpha = key
+        self.resized_keys.add((path, size, flip_x, alpha))
+        return self.image(path, size, flip_x, alpha)
+
+    def render_variant(
+        self,
+        path: str | Path,
+        size: tuple[int, int] | None = None,
+        flip_x: bool = False,
+        alpha: bool = True,
+    ) -> Surface:
+        # Builds an image variant from its source art, bypassing the cache and any baked copy
+        surf = image.load(self.open(path), Path(path).name)
+        surf = surf.convert_alpha() if alpha else surf.convert()
+        if size is not None and surf.get_size() != size:
+            surf = smoothscale(surf, size)
+        if flip_x:
+            surf = flip(surf, True, False)
+        return surf
+
+    def source_sha1(self, path: str | Path) -> str:
+        # Baked variants record the hash of the art they were made from; one whose source has changed since
+        # is stale and ignored until src/bake.py runs again
+        path = Path(path).as_posix()
+        digest = self.source_hashes.get(path)
+        if digest is None:
+            digest = self.source_hashes[path] = hashlib.sha1(self.read(path)).hexdigest()
+        return digest
+
+    def baked_variants(self) -> dict[str, dict]:
+        if self.baked is None:
+            self.baked = {}
+            if self.exists(BAKED_MANIFEST):
+                self.baked = json.loads(self.read(BAKED_MANIFEST))["variants"]
+        return self.baked
+
+    def sound(self, path: str | Path, volume: float = 1.0) -> Sound:
+        key = (Path(path).as_posix(), volume)
+        sound = self.sounds.get(key)
+        if sound is not None:
+            self.hits += 1
+            return sound
+
+        self.misses += 1
+        start = time.perf_counter()
+        sound = Sound(self.open(path))
+        sound.set_volume(volume)
+        self.load_time += time.perf_counter() - start
+
+        self.sounds[key] = sound
+        return sound
+
+    def sound_dir(self, directory: str | Path, volume: float = 1.0) -> list[Sound]:
+        # Every .ogg in a directory, sorted so the list order doesn't depend on the filesystem
+        key = (Path(directory).as_posix(), volume)
+        sounds = self.sound_lists.get(key)
+        if sounds is not None:
+            self.hits += 1
+            return sounds
+
+        sounds = [self.sound(path, volume) for path in self.listdir(directory, ".ogg")]
+        self.sound_lists[key] = sounds
+        return sounds
+
+    def music(self, path: str | Path) -> io.BytesIO:
+        # Music streams from its file while it plays, so only the still compressed file is kept in memory.
+        # Every call returns a new stream over it, for pygame.mixer.music.load to own.
+        key = Path(path).as_posix()
+        data = self.music_files.get(key)
+        if data is not None:
+            self.hits += 1
+            return io.BytesIO(data)
+
+        self.misses += 1
+        start = time.perf_counter()
+        data = self.read(path)
+        self.load_time += time.perf_counter() - start
+
+        self.music_files[key] = data
+        return io.BytesIO(data)
+
+    def font(self, path: str | Path, size: int) -> Font:
+        key = (Path(path).as_posix(), size)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.hits += 1
+            return font
+
+        self.misses += 1
+        start = time.perf_counter()
+        font = Font(self.open(path), size)
+        self.load_time += time.perf_counter() - start
+
+        self.fonts[key] = font
+        return font
+
+    def clear(self):
+        self.surfaces.clear()
+        self.sounds.clear()
+        self.sound_lists.clear()
+        self.music_files.clear()
+        self.fonts.clear()
+        self.baked = None
+        self.source_hashes.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "load_time_ms": round(self.load_time * 1000, 3),
+            "surfaces": len(self.surfaces),
+            "sounds": len(self.sounds),
+        }
+
+
+class TextCache:
+    # Least-recently-used cache of rendered text surfaces, keyed by (font, text, color, antialias).
+    # The same string in the same font and color is only rendered once while it stays in the cache.
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.surfaces: OrderedDict[tuple, Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font: Font, text: str, color, antialias: bool = True) -> Surface:
+        key = (font, text, tuple(color), antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.surfaces),
+        }
+
+
+class BackgroundLoader:
+    # Runs loading steps one after another on a worker thread, so the main thread stays free to draw a
+    # loading screen. The steps usually fill the registry; the display mode must be set before they start
+    # because images are converted as they load. Decoding images and sounds releases the GIL. The registry
+    # has no lock, so the steps start as soon as the loader is made and nothing else may use the registry
+    # until done() is true.
+    # Usage: loader = BackgroundLoader(asset_loaders())
+    #        while not loader.done(): draw_progress(loader.progress())
+    #        loader.wait()  # raises whatever a step raised
+    def __init__(self, steps: list[Callable[[], Any]]):
+        self.steps = list(steps)
+        self.completed = 0
+        self.cancelled = False
+        self.elapsed = 0.0
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asset-loader")
+        self.future = executor.submit(self.__run)
+        executor.shutdown(wait=False)
+
+    def __run(self):
+        start = time.perf_counter()
+        for step in self.steps:
+            if self.cancelled:
+                break
+            step()
+            self.completed += 1
+        self.elapsed = time.perf_counter() - start
+
+    def progress(self) -> float:
+        return self.completed / len(self.steps) if self.steps else 1.0
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def wait(self):
+        self.future.result()
+
+    def cancel(self):
+        # Stops after the step that is running, and waits for it
+        self.cancelled = True
+        self.future.exception()
+
+
+registry = AssetRegistry(AssetBundle(ASSETS_BUNDLE) if USE_ASSET_BUNDLE and ASSETS_BUNDLE.exists() else None)
+text_cache = TextCache()
@@ -0,0 +1,89 @@
+from collections import deque
+import pygame
+from pygame.mixer import Channel, Sound
+
+# Category: (reserved channels, max plays per window, window in ms)
+SOUND_CATEGORIES = {
+    "footsteps": (4, 6, 500),
+    "attack": (6, 12, 250),
+    "damage": (6, 12, 250),
+    "ui": (2, 8, 250),
+}
+
+
+class VoiceManager:
+    # Plays sound effects through a reserved pool of mixer channels per category, so a big battle
+    # can't starve the rest of the game of channels or flood the mixer with Sound.play() calls.
+    # - The same sound started twice in one category within one frame is only played once (merged).
+    # - Each category allows a limited number of plays per time window; the rest are dropped.
+    # - When every channel of a pool is busy, the quietest voice is stolen, the oldest one on a tie.
+    # begin_frame() must be called once per frame with the frame's delta_time.
+    def __init__(self, categories: dict[str, tuple[int, int, int]] = SOUND_CATEGORIES, profiler=None):
+        self.categories = categories
+        self.profiler = profiler
+        self.now = 0
+        self.frame_sounds: set[tuple[str, Sound]] = set()
+        self.recent: dict[str, deque[int]] = {category: deque() for category in categories}
+        self.pools: dict[str, list[Channel]] = {}
+        self.started: dict[Channel, tuple[int, float]] = {}
+        self.played = 0
+        self.merged = 0
+        self.dropped = 0
+        self.stolen = 0
+
+        self.enabled = pygame.mixer.get_init() is not None
+        if self.enabled:
+            reserved = sum(channels for channels, _, _ in categories.values())
+            pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), reserved + 8))
+            pygame.mixer.set_reserved(reserved)
+            first = 0
+            for category, (channels, _, _) in categories.items():
+                self.pools[category] = [Channel(i) for i in range(first, first + channels)]
+                first += channels
+
+    def begin_frame(self, delta_time):
+        self.now += delta_time
+        self.frame_sounds.clear()
+
+    def play(self, category: str, sound: Sound):
+        if not self.enabled:
+            return
+        if self.profiler is None:
+            self.__play(category, sound)
+            return
+        self.profiler.begin("sound")
+        self.__play(category, sound)
+        self.profiler.end()
+
+    def __play(self, category: str, sound: Sound):
+        if (category, sound) in self.frame_sounds:
+            self.merged += 1
+            return
+
+        _, max_plays, window = self.categories[category]
+        recent = self.recent[category]
+        while recent and recent[0] <= self.now - window:
+            recent.popleft()
+        if len(recent) >= max_plays:
+            self.dropped += 1
+            return
+
+        pool = self.pools[category]
+        channel = next((c for c in pool if not c.get_busy()), None)
+        if channel is None:
+            channel = min(pool, key=lambda c: self.started.get(c, (0, 0.0))[::-1])
+            self.stolen += 1
+
+        channel.play(sound)
+        self.started[channel] = (self.now, sound.get_volume() * channel.get_volume())
+        self.frame_sounds.add((category, sound))
+        recent.append(self.now)
+        self.played += 1
+
+    def stats(self) -> dict:
+        return {
+            "played": self.played,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "stolen": self.stolen,
+        }
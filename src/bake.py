@@ -0,0 +1,84 @@
+import argparse
+import json
+from pathlib import Path
+
+import headless  # Sets up the dummy video and audio drivers before pygame starts
+import pygame
+
+from assets import registry, variant_name
+from consts import *
+from main import screen_image_variants
+from sprites import image_variants
+
+
+def collect_variants() -> list[tuple]:
+    # Every scaled or flipped image the game asks the registry for, as declared next to the code that loads
+    # them: the sprite art plus each screen's widgets. Nothing is loaded. Returns (path, size, flip_x, alpha)
+    # tuples.
+    return sorted(set(image_variants() + screen_image_variants()))
+
+
+def output_path(path: str, size: tuple[int, int] | None, flip_x: bool) -> str:
+    # "title_screen/arrow.png", (51, 20), flipped -> "baked/title_screen/arrow_51x20_flip.png"
+    source = Path(path)
+    name = source.stem
+    if size is not None:
+        name += f"_{size[0]}x{size[1]}"
+    if flip_x:
+        name += "_flip"
+    return (Path(BAKED_DIR) / source.parent / f"{name}.png").as_posix()
+
+
+def bake(force: bool = False) -> dict:
+    # Writes each variant to ASSETS_DIR/baked and records it in the manifest. A variant is only
+    # rebuilt when its source file changed, its output is missing, or it is new (e.g. a new size).
+    registry.bundle = None  # Baking reads and writes the loose files
+    registry.clear()
+    manifest_file = ASSETS_DIR / BAKED_MANIFEST
+    old = json.loads(manifest_file.read_text())["variants"] if manifest_file.exists() else {}
+
+    variants = {}
+    built = skipped = 0
+    for path, size, flip_x, alpha in collect_variants():
+        entry = {
+            "file": output_path(path, size, flip_x),
+            "source": path,
+            "source_sha1": registry.source_sha1(path),
+            "size": list(size) if size is not None else None,
+            "flip_x": flip_x,
+        }
+        name = variant_name(path, size, flip_x)
+        out_file = ASSETS_DIR / entry["file"]
+        if not force and old.get(name) == entry and out_file.exists():
+            skipped += 1
+        else:
+            out_file.parent.mkdir(parents=True, exist_ok=True)
+            pygame.image.save(registry.render_variant(path, size, flip_x, alpha), out_file)
+            built += 1
+        variants[name] = entry
+
+    removed = 0
+    current_files = {entry["file"] for entry in variants.values()}
+    for entry in old.values():
+        if entry["file"] not in current_files and (ASSETS_DIR / entry["file"]).exists():
+            (ASSETS_DIR / entry["file"]).unlink()
+            removed += 1
+
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    manifest_file.write_text(json.dumps({"variants": variants}, indent=2, sort_keys=True) + "\n")
+    registry.clear()
+    return {"built": built, "skipped": skipped, "removed": removed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-scale and pre-flip the images the game uses into assets/baked.")
+    parser.add_argument("--force", action="store_true", help="rebuild every variant")
+    args = parser.parse_args()
+
+    headless.init_headless()
+    print(json.dumps(bake(args.force)))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
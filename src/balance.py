@@ -0,0 +1,172 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import headless  # Sets up the dummy video and audio drivers before pygame starts
+from consts import *
+
+# Size of the party picked on the title screen
+PARTY_SIZE = 5
+
+# Set in each worker process by init_worker
+_screen = None
+
+
+def compositions(party_size: int = PARTY_SIZE) -> list[tuple[int, int, int]]:
+    # Every (Warriors, Rangers, Mages) split of the party, e.g. 21 of them for 5 units
+    return [
+        (warriors, rangers, party_size - warriors - rangers)
+        for warriors in range(party_size, -1, -1)
+        for rangers in range(party_size - warriors, -1, -1)
+    ]
+
+
+def init_worker():
+    global _screen
+    _screen = headless.init_headless()
+
+
+def run_game(job: tuple) -> dict:
+    # One seeded game in a worker process. Every game has its own random numbers and unit stats, so a
+    # result doesn't depend on which worker ran it or what ran before it.
+    composition, seed, settings, max_steps, max_rooms, use_combat_engine, use_flow_field = job
+    units = dict(zip(headless.PLAYABLE_TYPES.values(), composition))
+    result = headless.simulate(
+        _screen,
+        units,
+        max_steps=max_steps,
+        max_rooms=max_rooms,
+        seed=seed,
+        use_combat_engine=use_combat_engine,
+        settings=settings,
+        use_flow_field=use_flow_field,
+    )
+    return {"composition": composition, "seed": seed, "settings": settings, **result}
+
+
+def summarize(rooms: list[int]) -> dict:
+    histogram = {}
+    for count in sorted(rooms):
+        histogram[count] = histogram.get(count, 0) + 1
+    return {
+        "games": len(rooms),
+        "mean": round(statistics.mean(rooms), 3),
+        "median": statistics.median(rooms),
+        "stdev": round(statistics.pstdev(rooms), 3),
+        "min": min(rooms),
+        "max": max(rooms),
+        "histogram": histogram,
+    }
+
+
+def sweep(
+    seeds: int,
+    settings_list: list[dict],
+    workers: int | None = None,
+    max_steps: int = 100_000,
+    max_rooms: int | None = None,
+    use_combat_engine: bool = False,
+    use_flow_field: bool = FLOW_FIELD_NAVIGATION,
+) -> dict:
+    # Plays every composition with seeds 0..seeds-1 under each settings dict and groups rooms_cleared
+    # by (settings, composition). Jobs are spread over one process per core in chunks, so the pool
+    # isn't dominated by pickling overhead when there are many short games.
+    workers = workers or os.cpu_count() or 1
+    jobs = [
+        (composition, seed, settings, max_steps, max_rooms, use_combat_engine, use_flow_field)
+        for settings in settings_list
+        for composition in compositions()
+        for seed in range(seeds)
+    ]
+    chunksize = max(1, len(jobs) // (workers * 4))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        games = list(pool.map(run_game, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    groups = {}
+    for game in games:
+        key = (json.dumps(game["settings"], sort_keys=True), game["composition"])
+        groups.setdefault(key, []).append(game["rooms_cleared"])
+
+    return {
+        "workers": workers,
+        "games": len(games),
+        "elapsed_seconds": round(elapsed, 3),
+        "games_per_second": round(len(games) / elapsed, 2) if elapsed else None,
+        "results": [
+            {
+                "settings": json.loads(settings),
+                "composition": dict(zip(headless.PLAYABLE_TYPES, composition)),
+                "rooms_cleared": summarize(rooms),
+            }
+            for (settings, composition), rooms in groups.items()
+        ],
+    }
+
+
+def write_csv(report: dict, out):
+    setting_names = sorted({name for result in report["results"] for name in result["settings"]})
+    writer = csv.writer(out)
+    writer.writerow(setting_names + list(headless.PLAYABLE_TYPES) + ["games", "mean", "median", "stdev", "min", "max"])
+    for result in report["results"]:
+        rooms = result["rooms_cleared"]
+        writer.writerow(
+            [result["settings"].get(name, "") for name in setting_names]
+            + list(result["composition"].values())
+            + [rooms["games"], rooms["mean"], rooms["median"], rooms["stdev"], rooms["min"], rooms["max"]]
+        )
+
+
+def parse_values(text: str | None) -> list[int | None]:
+    # "2,3,4" -> [2, 3, 4]; no value means the game's default
+    return [int(value) for value in text.split(",")] if text else [None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play every starting party for many seeds and report how far each gets.")
+    parser.add_argument("--seeds", type=int, default=20, help="games per composition and setting (default: 20)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--max-steps", type=int, default=100_000, help="step limit per game")
+    parser.add_argument("--max-rooms", type=int, default=None, help="stop a game after this many rooms")
+    parser.add_argument("--engine", action="store_true", help="use the NumPy combat engine")
+    headless.add_flow_field_argument(parser)
+    parser.add_argument("--enemy-scaling", help=f"enemy stat upgrade intervals to sweep (default: {ENEMY_SCALING_INTERVAL})")
+    parser.add_argument("--reinforcement", help=f"new unit intervals to sweep (default: {REINFORCEMENT_INTERVAL})")
+    parser.add_argument("--room-growth", help=f"bigger room intervals to sweep (default: {ROOM_GROWTH_INTERVAL})")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--output", help="report file (default: stdout)")
+    args = parser.parse_args()
+
+    settings_list = []
+    for enemy_scaling, reinforcement, room_growth in itertools.product(
+        parse_values(args.enemy_scaling), parse_values(args.reinforcement), parse_values(args.room_growth)
+    ):
+        settings = {
+            "enemy_scaling_interval": enemy_scaling,
+            "reinforcement_interval": reinforcement,
+            "room_growth_interval": room_growth,
+        }
+        settings_list.append({name: value for name, value in settings.items() if value is not None})
+
+    report = sweep(args.seeds, settings_list, args.workers, args.max_steps, args.max_rooms, args.engine, args.flow_field)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    if args.format == "csv":
+        write_csv(report, out)
+    else:
+        json.dump(report, out, indent=2)
+        out.write("\n")
+    if args.output:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import headless  # Sets up the dummy video and audio drivers before pygame starts
+import pygame
+
+from assets import registry, text_cache
+from consts import *
+from main import GameState
+from pools import pool_stats, pools
+from sprites import Warrior, Ranger, Mage, Skeleton, Zombie
+
+# Most Python heap bytes one live unit may take, counting its entries in the groups it is in
+UNIT_MEMORY_BUDGET = 768
+
+
+def place_units(game: GameState, units: dict[type, int], rng: random.Random):
+    # Puts a party straight onto the field, skipping the spawn rules so big rooms can be built
+    if game.combat_engine is not None:
+        game.combat_engine.invalidate()
+    for unit_type, count in units.items():
+        for _ in range(count):
+            unit_type.spawn((rng.randint(0, SCREEN_WIDTH), rng.randint(SCREEN_HEIGHT * 2 // 3, SCREEN_HEIGHT)), game.stats, game.all_players, game.all_entities)
+
+
+def build_room(units: dict[type, int], enemies: int, options: dict, seed: int) -> GameState:
+    # options are GameState keyword arguments; games are muted unless they say otherwise
+    game = GameState(GameState.States.TITLE_SCREEN, seed=seed, **{"muted": True, **options})
+    game.lower_bound = game.upper_bound = enemies
+    game.transition_state(GameState.States.GAME_SCREEN)
+    place_units(game, units, random.Random(seed))
+    return game
+
+
+def title_screen(options: dict, seed: int) -> GameState:
+    game = GameState(GameState.States.TITLE_SCREEN, seed=seed, **{"muted": True, **options})
+    return game
+
+
+def normal_room(options: dict, seed: int) -> GameState:
+    return build_room({Warrior: 2, Ranger: 2, Mage: 1}, 6, options, seed)
+
+
+def big_room(options: dict, seed: int) -> GameState:
+    # 500 units: 250 in the party and 250 enemies
+    return build_room({Warrior: 100, Ranger: 100, Mage: 50}, 250, options, seed)
+
+
+def stats_overlay(options: dict, seed: int) -> GameState:
+    game = normal_room(options, seed)
+    game.show_stats = True
+    return game
+
+
+SCENARIOS = {
+    "title_screen": title_screen,
+    "normal_room": normal_room,
+    "big_room": big_room,
+    "stats_overlay": stats_overlay,
+}
+
+
+def percentiles(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered), 4),
+        "p50_ms": round(pick(50), 4),
+        "p95_ms": round(pick(95), 4),
+        "p99_ms": round(pick(99), 4),
+        "max_ms": round(ordered[-1], 4),
+    }
+
+
+def run_scenario(screen: pygame.Surface, game: GameState, frames: int, delta_time: int) -> dict:
+    update_ms = []
+    draw_ms = []
+    for _ in range(frames):
+        pygame.event.pump()
+        start = time.perf_counter()
+        game.update(screen, delta_time)
+        mid = time.perf_counter()
+        game.draw(screen)
+        end = time.perf_counter()
+        update_ms.append((mid - start) * 1000)
+        draw_ms.append((end - mid) * 1000)
+    return {
+        "update": percentiles(update_ms),
+        "draw": percentiles(draw_ms),
+        "entities_at_end": len(game.all_entities),
+        "pools": pool_stats(),
+        "assets": registry.stats(),
+        "text_cache": text_cache.stats(),
+        "audio": game.audio.stats(),
+    }
+
+
+def unit_memory(count: int, seed: int) -> dict:
+    # Python heap bytes per unit, as traced by tracemalloc, after spawning `count` units into a room the way the
+    # game does: party and enemies alike, each in its side's group and in all_entities. Images and sounds are
+    # shared per class and their pixels live in SDL, outside tracemalloc. gc_ms is a full collection with the
+    # units alive. Pools are emptied first so every run builds its units from scratch.
+    pools.clear()
+    game = title_screen({}, seed)
+    rng = random.Random(seed)
+    unit_types = [Warrior, Ranger, Mage, Skeleton, Zombie]
+    gc.collect()
+    tracemalloc.start()
+    for i in range(count):
+        unit_type = unit_types[i % len(unit_types)]
+        side = game.all_enemies if unit_type.is_enemy else game.all_players
+        unit_type.spawn((rng.randint(0, SCREEN_WIDTH), rng.randint(PLAY_AREA_TOP, SCREEN_HEIGHT)), game.stats, side, game.all_entities)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    gc.collect()
+    gc_ms = (time.perf_counter() - start) * 1000
+    game.transition_state(GameState.States.TITLE_SCREEN)
+    return {
+        "units": count,
+        "bytes": used,
+        "bytes_per_unit": round(used / count),
+        "budget": UNIT_MEMORY_BUDGET,
+        "gc_ms": round(gc_ms, 3),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time GameState.update and GameState.draw on fixed scenarios.")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--frames", type=int, default=300, help="frames timed per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed frames before timing starts")
+    parser.add_argument("--dt", type=int, default=SIMULATION_STEP, help="milliseconds simulated per frame")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", action="store_true", help="use the NumPy combat engine")
+    parser.add_argument("--dirty", action="store_true", help="use dirty-rect rendering")
+    headless.add_flow_field_argument(parser)
+    parser.add_argument("--sound", action="store_true", help="play sounds through the dummy audio driver and time the voice manager too")
+    parser.add_argument("--render-scale", type=float, default=1.0, help="draw at this fraction of the window's resolution")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument(
+        "--memory",
+        type=int,
+        nargs="*",
+        help=f"instead of timing, measure memory per unit with this many units (default: 1000 10000) "
+        f"and fail if any run is over {UNIT_MEMORY_BUDGET} bytes per unit",
+    )
+    args = parser.parse_args()
+    if args.dt != SIMULATION_STEP:
+        # The game is only ever played at SIMULATION_STEP ticks: other steps move units a different
+        # distance per update and give numbers that don't match real play
+        print(f"warning: --dt {args.dt} is not SIMULATION_STEP ({SIMULATION_STEP} ms)", file=sys.stderr)
+
+    screen = headless.init_headless()
+    if args.memory is not None:
+        runs = [unit_memory(count, args.seed) for count in args.memory or [1000, 10_000]]
+        print(json.dumps({"revision": git_revision(), "python": platform.python_version(), "runs": runs}, indent=2))
+        pygame.quit()
+        sys.exit(0 if all(run["bytes_per_unit"] <= UNIT_MEMORY_BUDGET for run in runs) else 1)
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "frames": args.frames,
+        "dt": args.dt,
+        "seed": args.seed,
+        "engine": args.engine,
+        "dirty": args.dirty,
+        "flow_field": args.flow_field,
+        "sound": args.sound,
+        "render_scale": args.render_scale,
+        "scenarios": {},
+    }
+    options = {
+        "use_combat_engine": args.engine,
+        "dirty_rendering": args.dirty,
+        "use_flow_field": args.flow_field,
+        "render_scale": args.render_scale,
+        "muted": not args.sound,
+    }
+    for name in args.scenarios:
+        game = SCENARIOS[name](options, args.seed)
+        run_scenario(screen, game, args.warmup, args.dt)
+        report["scenarios"][name] = run_scenario(screen, game, args.frames, args.dt)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
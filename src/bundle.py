@@ -0,0 +1,113 @@
+import argparse
+import io
+import json
+import mmap
+import struct
+import time
+from pathlib import Path
+
+# File layout: MAGIC, uint32 index size, JSON index {"relative/path.png": [offset, size]}, then the file data.
+# Offsets are relative to the start of the data.
+MAGIC = b"STCPAK01"
+HEADER = struct.Struct("<8sI")
+
+
+class AssetBundle:
+    # Read-only view of a packed asset file. The whole file is memory-mapped, so opening an asset is a
+    # slice of the mapping rather than a filesystem lookup. Paths are relative to the assets directory.
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an asset bundle")
+        self.index: dict[str, list[int]] = json.loads(self.data[HEADER.size:HEADER.size + index_size])
+        self.data_start = HEADER.size + index_size
+
+    def __contains__(self, path: str | Path) -> bool:
+        return Path(path).as_posix() in self.index
+
+    def read(self, path: str | Path) -> memoryview:
+        offset, size = self.index[Path(path).as_posix()]
+        start = self.data_start + offset
+        return memoryview(self.data)[start:start + size]
+
+    def open(self, path: str | Path) -> io.BytesIO:
+        # pygame.image.load, mixer.Sound, mixer.music and font.Font all accept file-like objects
+        return io.BytesIO(self.read(path))
+
+    def listdir(self, directory: str | Path, suffix: str = "") -> list[str]:
+        prefix = Path(directory).as_posix().rstrip("/") + "/"
+        return sorted(
+            name for name in self.index
+            if name.startswith(prefix) and "/" not in name[len(prefix):] and name.endswith(suffix)
+        )
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def pack(assets_dir: Path, out_path: Path) -> int:
+    # Packs every file under assets_dir into one bundle. Returns the number of files packed.
+    files = sorted(p for p in Path(assets_dir).rglob("*") if p.is_file())
+    index = {}
+    offset = 0
+    for path in files:
+        size = path.stat().st_size
+        index[path.relative_to(assets_dir).as_posix()] = [offset, size]
+        offset += size
+
+    index_bytes = json.dumps(index, separators=(",", ":")).encode()
+    with open(out_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, len(index_bytes)))
+        out.write(index_bytes)
+        for path in files:
+            out.write(path.read_bytes())
+    return len(files)
+
+
+def bench_startup(bundle_path: Path, repeat: int):
+    # Times loading everything the game loads before its first frame, from loose files and from the bundle.
+    # Loose files are read from ASSETS_DIR like in the game, so the bundle should be packed from there too.
+    # The OS file cache is warm after the first pass, so this measures lookup and open overhead, not disk reads.
+    import headless
+    from assets import registry
+    from sprites import preload_assets
+
+    headless.init_headless()
+    bundle = AssetBundle(bundle_path)
+    results = {}
+    for mode, source in [("loose", None), ("bundle", bundle)]:
+        timings = []
+        for _ in range(repeat):
+            registry.clear()
+            registry.bundle = source
+            start = time.perf_counter()
+            preload_assets()
+            registry.font("font/morris-roman.black.ttf", 24)
+            for background in ["title_screen/title.png", "background.png", "game_over/background.png"]:
+                registry.image(background, alpha=False)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[mode] = {"best_ms": round(min(timings), 2), "mean_ms": round(sum(timings) / len(timings), 2)}
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the assets directory into a single memory-mapped bundle.")
+    parser.add_argument("command", choices=["pack", "bench"])
+    parser.add_argument("--assets", default="assets", help="assets directory to pack (default: assets)")
+    parser.add_argument("--output", default="assets.pak", help="bundle file (default: assets.pak)")
+    parser.add_argument("--repeat", type=int, default=5, help="startup benchmark passes per mode")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack(Path(args.assets), Path(args.output))
+        print(f"Packed {count} files into {args.output}")
+    else:
+        bench_startup(Path(args.output), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+import math
+
+from pygame import Rect
+
+from sprites import Unit, Warrior, Ranger, Mage, Skeleton, Zombie, Chest
+
+try:
+    import numpy as np
+except ImportError:  # The engine is optional, the per-sprite path doesn't need numpy
+    np = None
+
+
+UNIT_TYPES = [Warrior, Ranger, Mage, Skeleton, Zombie, Chest]
+CHEST_ID = UNIT_TYPES.index(Chest)
+
+# Animation frames, in the same order as Unit.frames()
+STANDING, ATTACKING, WALKING_1, WALKING_2 = range(4)
+
+# Upper bound on the number of unit-opponent pairs looked at in one go, keeps memory flat for huge rooms
+CHUNK_ELEMENTS = 1 << 20
+# Cells of an opponent grid hold about this many opponents each, see CellGrid
+GRID_OPPONENTS_PER_CELL = 8
+# Rings of cells searched for the nearest opponent before falling back to looking at all of them, and the
+# number of unit-opponent pairs below which looking at all of them straight away is quicker
+GRID_SEARCH_RINGS = 16
+DIRECT_SEARCH_PAIRS = 1 << 18
+# Squared distance and sprite index packed into one int64, so one minimum finds the nearest opponent and
+# breaks ties toward the first in group order
+KEY_SCALE = 1 << 24
+
+# Cell offsets (x, y) of the square ring r cells away from a cell, by r
+ring_offsets: dict[int, tuple] = {}
+
+
+def ring(r: int) -> tuple:
+    offsets = ring_offsets.get(r)
+    if offsets is None:
+        span = np.arange(-r, r + 1)
+        ox, oy = np.meshgrid(span, span)
+        edge = np.maximum(abs(ox), abs(oy)) == r
+        offsets = ring_offsets[r] = (ox[edge], oy[edge])
+    return offsets
+
+
+def block(r: int) -> tuple:
+    # Offsets of every cell up to r cells away
+    rings = [ring(i) for i in range(r + 1)]
+    return np.concatenate([ox for ox, _ in rings]), np.concatenate([oy for _, oy in rings])
+
+
+class CellGrid:
+    # The opponents of one team's update bucketed into square cells by rect center, the scheme SpatialHash
+    # uses, as index arrays: queries only look at opponents in the cells around each unit instead of at all
+    # of them. Opponents don't move while the other team updates, so a grid lasts for one team update;
+    # opponents killed in the meantime are skipped through the engine's alive array.
+    # cx and cy are the rect centers of every sprite, members the indices of the opponents. The cell size
+    # adapts to how crowded the opponents are, about GRID_OPPONENTS_PER_CELL per cell.
+    def __init__(self, members, cx, cy):
+        self.cx = cx
+        self.cy = cy
+        mx = cx[members]
+        my = cy[members]
+        area = int(mx.max() - mx.min() + 1) * int(my.max() - my.min() + 1)
+        self.cell_size = max(1, math.isqrt(area * GRID_OPPONENTS_PER_CELL // len(members)))
+        gx = mx // self.cell_size
+        gy = my // self.cell_size
+        self.left = int(gx.min())
+        self.top = int(gy.min())
+        self.cols = int(gx.max()) - self.left + 1
+        self.rows = int(gy.max()) - self.top + 1
+        # One empty cell of padding all around, so cells off the grid can be clipped onto it
+        cell = (gy - self.top + 1) * (self.cols + 2) + (gx - self.left + 1)
+        order = np.argsort(cell, kind="stable")
+        self.members = members[order]
+        counts = np.bincount(cell, minlength=(self.cols + 2) * (self.rows + 2))
+        self.ends = np.cumsum(counts)
+        self.starts = self.ends - counts
+        self.most = int(counts.max())
+
+    def chunk_rows(self, offsets) -> int:
+        # Queries whose pairs() with these offsets can't go over CHUNK_ELEMENTS
+        return max(1, CHUNK_ELEMENTS // (len(offsets[0]) * self.most))
+
+    def pairs(self, gx, gy, offsets) -> tuple:
+        # (query row, member) for every member in the cells at `offsets` from each query's cell (gx, gy),
+        # grouped by row
+        ox, oy = offsets
+        col = np.clip(gx[:, None] + ox[None, :] - self.left + 1, 0, self.cols + 1)
+        row = np.clip(gy[:, None] + oy[None, :] - self.top + 1, 0, self.rows + 1)
+        cell = row * (self.cols + 2) + col
+        starts = self.starts[cell]
+        counts = self.ends[cell] - starts
+        rows = np.repeat(np.arange(len(gx)), counts.sum(axis=1))
+        counts = counts.ravel()
+        within = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, self.members[np.repeat(starts.ravel(), counts) + within]
+
+    def nearest(self, x, y, alive) -> tuple:
+        # Index of and squared distance to the nearest live member from each center (x, y). The cells around
+        # each center are searched first, then ring by ring outward for up to GRID_SEARCH_RINGS rings. Centers
+        # still not settled, far from every member, are compared with all of them. Same result as comparing
+        # every center with every member, ties included.
+        best = np.full(len(x), np.iinfo(np.int64).max, dtype=np.int64)
+        pending = np.arange(len(x))
+        cell_size = self.cell_size
+        gx = x // cell_size
+        gy = y // cell_size
+        # Rings before the first one reaching the grid are empty, past the last every cell has been searched
+        right = self.left + self.cols - 1
+        bottom = self.top + self.rows - 1
+        first = np.maximum.reduce([self.left - gx, gx - right, self.top - gy, gy - bottom, np.zeros_like(gx)])
+        last = np.maximum.reduce([gx - self.left, right - gx, gy - self.top, bottom - gy])
+        r = 1
+        offsets = block(1)
+        while len(pending) and r <= GRID_SEARCH_RINGS:
+            reached = pending[first[pending] <= r]
+            step = self.chunk_rows(offsets)
+            for lo in range(0, len(reached), step):
+                part = reached[lo:lo + step]
+                rows, members = self.pairs(gx[part], gy[part], offsets)
+                live = alive[members]
+                rows = part[rows[live]]
+                members = members[live]
+                dx = (self.cx[members] - x[rows]).astype(np.int64)
+                dy = (self.cy[members] - y[rows]).astype(np.int64)
+                np.minimum.at(best, rows, (dx * dx + dy * dy) * KEY_SCALE + members)
+            # Everything in ring r + 1 and beyond is further than r * cell_size away
+            done = (best[pending] // KEY_SCALE <= (r * cell_size) ** 2) | (r >= last[pending])
+            pending = pending[~done]
+            r += 1
+            offsets = ring(r)
+        if len(pending):
+            members = self.members[alive[self.members]]
+            step = max(1, CHUNK_ELEMENTS // len(members))
+            for lo in range(0, len(pending), step):
+                part = pending[lo:lo + step]
+                dx = (self.cx[members][None, :] - x[part][:, None]).astype(np.int64)
+                dy = (self.cy[members][None, :] - y[part][:, None]).astype(np.int64)
+                best[part] = np.minimum(best[part], ((dx * dx + dy * dy) * KEY_SCALE + members).min(axis=1))
+        return best % KEY_SCALE, best // KEY_SCALE
+
+
+class CombatEngine:
+    # Runs the combat rules of Unit.update for every unit at once on NumPy arrays (positions, health,
+    # timers, team, class id) instead of one sprite at a time. The sprites stay in their groups and are
+    # only written to when something visible about them changes, so drawing works as before.
+    #
+    # The rules are the same as the sprite path: each team acts in group order, movement and attacks
+    # see kills made earlier in the same tick, and ties in targeting go to the first sprite in the group.
+    # With sounds muted the outcome is identical to the sprite path; with sounds on, footsteps use the
+    # game's random numbers in a different order, so the two paths drift apart. headless.py --check-engine
+    # plays seeded games both ways and fails if they ever differ.
+    #
+    # In big rooms targeting and range checks bin the opponents into a CellGrid first; below
+    # DIRECT_SEARCH_PAIRS every unit is compared with every opponent. This is not fast enough for thousands
+    # of units at 60 FPS: on one core a tick takes ~8 ms at 700 v 700 but ~15 ms at 1500 v 1500 while the
+    # armies close in, before anything is drawn.
+    #
+    # invalidate() must be called whenever sprites are added to or removed from the groups outside the
+    # engine (spawning, new rooms, screen changes), before anything new is spawned: it writes the arrays
+    # back while every row still belongs to the same unit, since dead sprites are reused by their pool.
+    # The arrays are reloaded from the sprites on the next step. Class stats are read from the game's
+    # StatTable `stats`.
+    def __init__(self, players, enemies, stats):
+        if np is None:
+            raise ImportError("CombatEngine requires numpy (pip install numpy)")
+        self.players = players
+        self.enemies = enemies
+        self.stats = stats
+        self.sprites = []
+        self.dirty = True
+
+    def invalidate(self):
+        if not self.dirty:
+            self.flush()
+            self.sprites = []
+        self.dirty = True
+
+    def load(self):
+        self.flush()
+        players = list(self.players)
+        sprites = players + list(self.enemies)
+        self.sprites = sprites
+
+        self.team = np.array([0] * len(players) + [1] * (len(sprites) - len(players)), dtype=np.int8)
+        self.class_id = np.array([UNIT_TYPES.index(type(s)) for s in sprites], dtype=np.int8)
+        self.is_unit = self.class_id != CHEST_ID
+        self.x = np.array([s.rect.x for s in sprites], dtype=np.int32)
+        self.y = np.array([s.rect.y for s in sprites], dtype=np.int32)
+        self.w = np.array([s.rect.w for s in sprites], dtype=np.int32)
+        self.h = np.array([s.rect.h for s in sprites], dtype=np.int32)
+        self.health = np.array([s.health for s in sprites], dtype=np.int64)
+        self.alive = np.ones(len(sprites), dtype=bool)
+
+        # Filled in by the last movement pass: who each unit headed for and whether something was in range
+        self.nearest = np.full(len(sprites), -1, dtype=np.int64)
+        self.blocked = np.zeros(len(sprites), dtype=bool)
+
+        units = [s if isinstance(s, Unit) else None for s in sprites]
+        self.attack_timer = np.array([s.time_since_last_attack if s else 0 for s in units], dtype=np.float64)
+        self.animation_timer = np.array([s.animation_timer if s else 0 for s in units], dtype=np.float64)
+        self.sound_timer = np.array([s.sound_timer if s else 0 for s in units], dtype=np.float64)
+        self.walking = np.array([s.walking if s else False for s in units], dtype=bool)
+        self.frame = np.array([s.frames().index(s.image) if s else STANDING for s in units], dtype=np.int8)
+
+        self.__remember_drawn()
+        self.dirty = False
+
+    def flush(self):
+        # Writes the full per-unit state back to the sprites, e.g. before switching back to the sprite path
+        for i, sprite in enumerate(self.sprites):
+            if isinstance(sprite, Unit) and self.alive[i]:
+                sprite.time_since_last_attack = self.attack_timer[i].item()
+                sprite.animation_timer = self.animation_timer[i].item()
+                sprite.sound_timer = self.sound_timer[i].item()
+                sprite.walking = bool(self.walking[i])
+        self.__sync_sprites()
+
+    def step(self, game, screen_rect: Rect, delta_time):
+        if self.dirty:
+            self.load()
+        for team in (0, 1):
+            self.__update_team(game, screen_rect, team, delta_time)
+        self.__sync_sprites()
+
+    def __class_stats(self):
+        stats = [self.stats[c] if c is not Chest else None for c in UNIT_TYPES]
+        speed = np.array([s.speed if s else 0 for s in stats], dtype=np.float64)
+        attack = np.array([s.attack if s else 0 for s in stats], dtype=np.int64)
+        distance = np.array([getattr(c, "attack_distance", 0) for c in UNIT_TYPES], dtype=np.int32)
+        delay = np.array([s.attack_delay if s else 0 for s in stats], dtype=np.float64)
+        return speed, attack, distance, delay
+
+    def __update_team(self, game, screen_rect: Rect, team: int, delta_time):
+        mine = np.flatnonzero((self.team == team) & self.alive)
+        if not len(mine):
+            return
+        actors = mine[self.is_unit[mine]]
+        self.__clamp(mine[~self.is_unit[mine]], screen_rect)
+        # Opponents binned for targeting when there are too many unit-opponent pairs to compare them all
+        opp = np.flatnonzero((self.team != team) & self.alive)
+        grid = None
+        if len(actors) * len(opp) > DIRECT_SEARCH_PAIRS:
+            grid = CellGrid(opp, self.x + self.w // 2, self.y + self.h // 2)
+
+        self.attack_timer[actors] += delta_time
+        self.animation_timer[actors] += delta_time
+        self.sound_timer[actors] += delta_time
+        self.__animate(actors)
+
+        start_x = self.x[actors]
+        start_y = self.y[actors]
+        speed, _, distance, delay = self.__class_stats()
+        self.__move(actors, start_x, start_y, speed, distance, screen_rect, grid)
+
+        # Attacks are resolved in group order. A kill can change targeting for every unit after the attacker,
+        # so the ones that were heading for or blocked by the dead unit redo their movement from where they
+        # started. Killing a chest changes stats, so then everyone after the attacker redoes it.
+        ready = np.flatnonzero(self.attack_timer[actors] >= delay[self.class_id[actors]])
+        r = 0
+        while r < len(ready):
+            k = ready[r]
+            killed = self.__attack(game, actors[k], distance)
+            r += 1
+            if not killed:
+                continue
+            rest = np.arange(k + 1, len(actors))
+            if any(self.class_id[j] == CHEST_ID for j in killed):
+                speed, _, distance, delay = self.__class_stats()
+                ready = np.concatenate([ready[:r], rest[self.attack_timer[actors[rest]] >= delay[self.class_id[actors[rest]]]]])
+            else:
+                killed = np.array(killed)
+                affected = np.isin(self.nearest[actors[rest]], killed)
+                blocked = rest[self.blocked[actors[rest]] & ~affected]
+                if len(blocked):
+                    in_range, _, _, _ = self.__in_range(actors[blocked], killed, start_x[blocked], start_y[blocked], distance)
+                    affected[blocked - (k + 1)] = in_range.any(axis=1)
+                rest = rest[affected]
+            self.__move(actors[rest], start_x[rest], start_y[rest], speed, distance, screen_rect, grid)
+
+        if not game.muted:
+            for i in actors[self.walking[actors] & (self.sound_timer[actors] > 500)]:
+                game.audio.play("footsteps", game.random.choice(Unit.footsteps))
+                self.sound_timer[i] = 0
+
+    def __animate(self, idx):
+        # Vectorized Unit.__set_surf
+        frame = self.frame[idx]
+        timer = self.animation_timer[idx]
+        walking = self.walking[idx]
+        in_walk = (frame == WALKING_1) | (frame == WALKING_2)
+
+        start_walk = walking & ~in_walk
+        toggle = walking & in_walk & (timer >= 400)
+        attacking = ~walking & (frame == ATTACKING)
+
+        new_frame = np.where(walking, frame, STANDING)
+        new_frame = np.where(attacking & (timer < 150), ATTACKING, new_frame)
+        new_frame = np.where(start_walk, WALKING_1, new_frame)
+        new_frame = np.where(toggle, np.where(frame == WALKING_1, WALKING_2, WALKING_1), new_frame)
+
+        self.frame[idx] = new_frame
+        self.animation_timer[idx] = np.where(start_walk | toggle, 0, timer)
+
+    def __clamp(self, idx, screen_rect: Rect):
+        self.x[idx] = np.maximum(np.minimum(self.x[idx], screen_rect.right - self.w[idx]), screen_rect.left)
+        self.y[idx] = np.maximum(np.minimum(self.y[idx], screen_rect.bottom - self.h[idx]), screen_rect.top)
+
+    def __in_range(self, idx, opp, x, y, distance):
+        # Vectorized Unit.__collided: rects overlap, or centers closer than the attacker's attack distance.
+        # Returns the pairwise squared center distances and center offsets as well.
+        w = self.w[idx][:, None]
+        h = self.h[idx][:, None]
+        ox, oy, ow, oh = self.x[opp], self.y[opp], self.w[opp], self.h[opp]
+        dx = (ox + ow // 2)[None, :] - (x + self.w[idx] // 2)[:, None]
+        dy = (oy + oh // 2)[None, :] - (y + self.h[idx] // 2)[:, None]
+        d2 = dx * dx + dy * dy
+        xs = x[:, None]
+        ys = y[:, None]
+        overlap = (xs < ox + ow) & (xs + w > ox) & (ys < oy + oh) & (ys + h > oy)
+        reach = distance[self.class_id[idx]][:, None]
+        return overlap | (d2 < reach * reach), d2, dx, dy
+
+    def __overlap_extent(self) -> int:
+        # Rects that overlap have centers less than this far apart on both axes
+        return int(max(self.w.max(), self.h.max())) + 1
+
+    def __overlapping(self, idx, x, y, grid: CellGrid):
+        # Whether each unit's rect, moved to (x, y), overlaps a live opponent's. Only opponents in the cells
+        # around it can.
+        cells = block(-(-self.__overlap_extent() // grid.cell_size))
+        hit = np.zeros(len(idx), dtype=bool)
+        step = grid.chunk_rows(cells)
+        for lo in range(0, len(idx), step):
+            part = idx[lo:lo + step]
+            xs = x[lo:lo + step]
+            ys = y[lo:lo + step]
+            w = self.w[part]
+            h = self.h[part]
+            rows, opp = grid.pairs((xs + w // 2) // grid.cell_size, (ys + h // 2) // grid.cell_size, cells)
+            live = self.alive[opp]
+            rows = rows[live]
+            opp = opp[live]
+            ox = self.x[opp]
+            oy = self.y[opp]
+            overlap = (xs[rows] < ox + self.w[opp]) & (xs[rows] + w[rows] > ox) & (ys[rows] < oy + self.h[opp]) & (ys[rows] + h[rows] > oy)
+            hit[lo + rows[overlap]] = True
+        return hit
+
+    def __move(self, idx, start_x, start_y, speed, distance, screen_rect: Rect, grid: CellGrid | None):
+        # Vectorized Unit.move_nearest_ip followed by the screen clamp, starting from (start_x, start_y).
+        # Without a grid every unit is compared with every opponent. With one, a unit is blocked when an
+        # opponent is in range: anything within attack distance is at least as far as the nearest opponent, and
+        # in a crowd the nearest opponent is usually the one its rect overlaps, so only units near opponents
+        # without overlapping the nearest one look at the cells around them.
+        if not len(idx):
+            return
+        opp = np.flatnonzero((self.team != self.team[idx[0]]) & self.alive)
+        if not len(opp):
+            self.x[idx] = start_x
+            self.y[idx] = start_y
+            self.walking[idx] = False
+            self.nearest[idx] = -1
+            self.blocked[idx] = False
+            self.__clamp(idx, screen_rect)
+            return
+
+        if grid is None:
+            in_range, d2, dx, dy = self.__in_range(idx, opp, start_x, start_y, distance)
+            k = np.argmin(d2, axis=1)
+            r = np.arange(len(idx))
+            nearest = opp[k]
+            ndx = dx[r, k].astype(np.float64)
+            ndy = dy[r, k].astype(np.float64)
+            blocked = in_range.any(axis=1)
+        else:
+            cx = start_x + self.w[idx] // 2
+            cy = start_y + self.h[idx] // 2
+            nearest, d2 = grid.nearest(cx, cy, self.alive)
+            ndx = (grid.cx[nearest] - cx).astype(np.float64)
+            ndy = (grid.cy[nearest] - cy).astype(np.float64)
+
+            reach = distance[self.class_id[idx]].astype(np.int64)
+            ox = self.x[nearest]
+            oy = self.y[nearest]
+            blocked = d2 < reach * reach
+            blocked |= (start_x < ox + self.w[nearest]) & (start_x + self.w[idx] > ox) & (start_y < oy + self.h[nearest]) & (start_y + self.h[idx] > oy)
+            extent = self.__overlap_extent()
+            near = np.flatnonzero(~blocked & (d2 < 2 * extent * extent))
+            if len(near):
+                blocked[near] = self.__overlapping(idx[near], start_x[near], start_y[near], grid)
+        moving = (self.frame[idx] != ATTACKING) & ((ndx != 0) | (ndy != 0)) & ~blocked
+        length = np.sqrt(ndx * ndx + ndy * ndy)
+        length[length == 0] = 1
+        unit_speed = speed[self.class_id[idx]]
+        step_x = np.trunc(ndx / length * unit_speed).astype(np.int32)
+        step_y = np.trunc(ndy / length * unit_speed).astype(np.int32)
+
+        self.x[idx] = np.where(moving, start_x + step_x, start_x)
+        self.y[idx] = np.where(moving, start_y + step_y, start_y)
+        self.walking[idx] = moving
+        self.nearest[idx] = nearest
+        self.blocked[idx] = blocked
+        self.__clamp(idx, screen_rect)
+
+    def __attack(self, game, i, distance) -> list[int]:
+        # Unit.do_attack for a single unit whose attack timer has run out. Returns the indices of everything it killed.
+        opp = np.flatnonzero((self.team != self.team[i]) & self.alive)
+        if not len(opp):
+            return []
+        idx = np.array([i])
+        in_range, _, _, _ = self.__in_range(idx, opp, self.x[idx], self.y[idx], distance)
+        targets = opp[in_range[0]]
+        if not len(targets):
+            return []
+
+        attacker = self.sprites[i]
+        self.frame[i] = ATTACKING
+        self.animation_timer[i] = 0
+        killed = []
+        for j in targets:
+            target = self.sprites[j]
+            self.health[j] -= attacker.stats.attack
+            if not game.muted and type(target) is not Chest:
+                game.audio.play("damage", game.random.choice(type(target).damage_sounds))
+            if self.health[j] <= 0:
+                self.alive[j] = False
+                target.health = self.health[j].item()
+                target.kill()
+                killed.append(j)
+            if not attacker.aoe_attack:
+                break
+        if not game.muted:
+            game.audio.play("attack", game.random.choice(type(attacker).attack_sounds))
+        self.attack_timer[i] = 0
+        return killed
+
+    def __remember_drawn(self):
+        self.drawn = (self.x.copy(), self.y.copy(), self.frame.copy(), self.health.copy())
+
+    def __sync_sprites(self):
+        # Only sprites whose position, frame or health changed are touched
+        if not self.sprites:
+            return
+        x, y, frame, health = self.drawn
+        changed = np.flatnonzero((self.x != x) | (self.y != y) | (self.frame != frame) | (self.health != health))
+        columns = zip(changed.tolist(), self.x[changed].tolist(), self.y[changed].tolist(), self.frame[changed].tolist(), self.health[changed].tolist())
+        health_bar_bg = Unit.health_bar_bg
+        for i, x, y, frame, health in columns:
+            sprite = self.sprites[i]
+            sprite.rect.topleft = (x, y)
+            sprite.health_bar_rect = health_bar_bg.get_rect(topleft=(x, y - 10))
+            sprite.health = health
+            if isinstance(sprite, Unit):
+                sprite.image = sprite.frames()[frame]
+        self.__remember_drawn()
@@ -1,21 +1,53 @@
 from pathlib import Path
-from pygame.event import custom_type
 import sys
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
+# Units are spawned below the HUD at the top of the screen
+PLAY_AREA_TOP = 75
 MOUSE_LEFT_CLICK = 1
 MOUSE_RIGHT_CLICK = 3
 BLACK = (0, 0, 0)
 GREEN = (0, 200, 0)
 CHEST_SPAWN_CHANCE = 0.05
-SHOW_NOTIFICATION = custom_type()
+# Every this many rooms: enemies get a random stat upgrade / rooms get bigger / a unit joins the party
+ENEMY_SCALING_INTERVAL = 3
+ROOM_GROWTH_INTERVAL = 5
+REINFORCEMENT_INTERVAL = 5
+# The game logic always advances in ticks of SIMULATION_STEP ms, whatever the frame rate.
+# That's 62.5 ticks per second. Unit speeds are pixels per tick, so units move about 4% faster than
+# in the old 60 FPS frame-locked loop the game was balanced at; timers and cooldowns count
+# milliseconds and are unchanged. 17 ms would be 4% slower instead, and the step has to be whole ms.
+SIMULATION_STEP = 16
+# Most ticks run for one rendered frame; past this the game slows down instead of falling further behind
+MAX_CATCH_UP_TICKS = 5
+RENDER_FPS = 60
+DIRTY_RECT_RENDERING = True
+# Fraction of the window's resolution frames are drawn at before being stretched over it, e.g. 0.5 for
+# hardware too slow to blend full-size frames. Dirty-rect rendering only applies at 1.
+RENDER_SCALE = 1.0
+# Units find their targets through a per-team flow field instead of scanning for the nearest opponent
+FLOW_FIELD_NAVIGATION = True
+FLOW_FIELD_CELL_SIZE = 25
+# Units fight through the NumPy combat engine (see src/combat.py, needs numpy) instead of one sprite at a
+# time, for rooms with thousands of units. It always targets the nearest opponent and ignores flow fields.
+COMBAT_ENGINE = False
 
 
 NUMBER_TO_STAT_NAME = ["Health", "Attack", "Speed", "Attack Speed"]
+NUMBER_TO_STAT_ATTRIBUTE = ["health", "attack", "speed", "attack_speed_scale"]
 
 # Check if we are in a pyinstaller "onefile" binary. Different path prefix in that case:
 if getattr(sys, "frozen", False):
     ASSETS_DIR = Path(sys._MEIPASS) / "assets"
+    ASSETS_BUNDLE = Path(sys._MEIPASS) / "assets.pak"
 else:
     ASSETS_DIR = Path("assets")
+    ASSETS_BUNDLE = Path("assets.pak")
+# Load assets from ASSETS_BUNDLE (see src/bundle.py) instead of the loose files. Frozen builds ship only the
+# bundle; elsewhere a left-over assets.pak would hide edits to the loose files, so it takes main.py --asset-bundle.
+USE_ASSET_BUNDLE = getattr(sys, "frozen", False)
+
+# Written by src/bake.py, relative to ASSETS_DIR
+BAKED_DIR = "baked"
+BAKED_MANIFEST = "baked/manifest.json"
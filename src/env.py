@@ -0,0 +1,258 @@
+import argparse
+import json
+import time
+
+import headless  # Sets up the dummy video and audio drivers before pygame starts
+import pygame
+
+from consts import *
+from main import GameState
+from sprites import Warrior, Ranger, Mage, Skeleton, Zombie, Chest
+
+try:
+    import numpy as np
+except ImportError:  # Only the environments need numpy
+    np = None
+
+
+PLAYABLE_TYPES = [Warrior, Ranger, Mage]
+# unit_type in observations indexes this list
+OBSERVED_TYPES = [Warrior, Ranger, Mage, Skeleton, Zombie, Chest]
+# Spawn positions agents can pick from: the centers of a grid of cells over the play area
+SPAWN_COLUMNS = 16
+SPAWN_ROWS = 10
+# Entity slots in an observation; entities past this are left out
+MAX_OBSERVED_ENTITIES = 64
+
+
+def spawn_position(cell: int) -> tuple[int, int]:
+    col, row = cell % SPAWN_COLUMNS, cell // SPAWN_COLUMNS
+    width = SCREEN_WIDTH / SPAWN_COLUMNS
+    height = (SCREEN_HEIGHT - PLAY_AREA_TOP) / SPAWN_ROWS
+    return int((col + 0.5) * width), int(PLAY_AREA_TOP + (row + 0.5) * height)
+
+
+class StormEnv:
+    # One game as a reinforcement learning environment, with the reset()/step() interface of Gymnasium:
+    #   observation, info = env.reset(seed=1)
+    #   observation, reward, terminated, truncated, info = env.step(action)
+    # Nothing is drawn and the game is muted. Each step applies one action and then runs ticks_per_step
+    # simulation ticks.
+    #
+    # Actions are ints: 0 waits, and 1 + unit * SPAWN_COLUMNS * SPAWN_ROWS + cell places a Warrior (unit 0),
+    # Ranger (1) or Mage (2) at the center of spawn grid cell `cell`, like selecting it with 1-3 and clicking
+    # there. A spawn the game refuses (none of that unit left, or an enemy in the way) just waits.
+    # Use StormEnv.spawn_action(Ranger, cell) to build one.
+    #
+    # Observations are a dict of NumPy arrays with one row per entity, padded to max_entities:
+    #   position (max_entities, 2) int16: center of each entity
+    #   health (max_entities,) int16
+    #   team (max_entities,) int8: 0 for the party, 1 for enemies and chests, -1 for an empty slot
+    #   unit_type (max_entities,) int8: index into OBSERVED_TYPES, -1 for an empty slot
+    #   playable_units (3,) int16: Warriors, Rangers and Mages left to place
+    # The reward is the number of rooms cleared during the step. An episode terminates when the party is
+    # wiped out and is truncated after max_steps steps.
+    action_count = 1 + len(PLAYABLE_TYPES) * SPAWN_COLUMNS * SPAWN_ROWS
+
+    def __init__(
+        self,
+        units: dict[type, int] | None = None,
+        ticks_per_step: int = 4,
+        max_steps: int | None = None,
+        max_entities: int = MAX_OBSERVED_ENTITIES,
+        use_combat_engine: bool = False,
+        use_flow_field: bool = FLOW_FIELD_NAVIGATION,
+        settings: dict | None = None,
+    ):
+        if np is None:
+            raise ImportError("StormEnv requires numpy (pip install numpy)")
+        self.units = dict(units) if units is not None else {Warrior: 2, Ranger: 2, Mage: 1}
+        self.ticks_per_step = ticks_per_step
+        self.max_steps = max_steps
+        self.max_entities = max_entities
+        self.use_combat_engine = use_combat_engine
+        self.use_flow_field = use_flow_field
+        self.settings = settings
+        self.screen = pygame.display.get_surface() or headless.init_headless()
+        self.session: headless.Session | None = None
+        self.steps = 0
+
+    @staticmethod
+    def spawn_action(unit_type: type, cell: int) -> int:
+        return 1 + PLAYABLE_TYPES.index(unit_type) * SPAWN_COLUMNS * SPAWN_ROWS + cell
+
+    def empty_observation(self, batch: tuple[int, ...] = ()) -> dict:
+        return {
+            "position": np.zeros(batch + (self.max_entities, 2), dtype=np.int16),
+            "health": np.zeros(batch + (self.max_entities,), dtype=np.int16),
+            "team": np.full(batch + (self.max_entities,), -1, dtype=np.int8),
+            "unit_type": np.full(batch + (self.max_entities,), -1, dtype=np.int8),
+            "playable_units": np.zeros(batch + (len(PLAYABLE_TYPES),), dtype=np.int16),
+        }
+
+    def reset(self, seed: int | None = None) -> tuple[dict, dict]:
+        self.session = headless.Session(
+            self.units,
+            delta_time=SIMULATION_STEP,
+            seed=seed,
+            auto_deploy=False,
+            use_combat_engine=self.use_combat_engine,
+            settings=self.settings,
+            use_flow_field=self.use_flow_field,
+        )
+        self.steps = 0
+        return self.observe(), self.info()
+
+    def step(self, action: int) -> tuple[dict, int, bool, bool, dict]:
+        game = self.session.game
+        rooms_cleared = game.rooms_cleared
+        spawned = False
+        if action:
+            unit, cell = divmod(int(action) - 1, SPAWN_COLUMNS * SPAWN_ROWS)
+            game.selected_unit = PLAYABLE_TYPES[unit]
+            count = len(game.all_players)
+            game.spawn_playable_unit(spawn_position(cell))
+            spawned = len(game.all_players) > count
+
+        for _ in range(self.ticks_per_step):
+            self.session.step(self.screen)
+            if self.session.finished():
+                break
+        self.steps += 1
+
+        terminated = game.screen_state != GameState.States.GAME_SCREEN
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+        return self.observe(), game.rooms_cleared - rooms_cleared, terminated, truncated, self.info(spawned)
+
+    def observe(self, out: dict | None = None) -> dict:
+        # Fills `out` (from empty_observation()) in place when given, e.g. one row of a batch
+        observation = out if out is not None else self.empty_observation()
+        game = self.session.game
+        position = observation["position"]
+        health = observation["health"]
+        team = observation["team"]
+        unit_type = observation["unit_type"]
+        i = 0
+        for side, group in ((0, game.all_players), (1, game.all_enemies)):
+            for entity in group:
+                if i == self.max_entities:
+                    break
+                position[i] = entity.rect.center
+                health[i] = entity.health
+                team[i] = side
+                unit_type[i] = OBSERVED_TYPES.index(type(entity))
+                i += 1
+        position[i:] = 0
+        health[i:] = 0
+        team[i:] = -1
+        unit_type[i:] = -1
+        observation["playable_units"][:] = [game.playable_units[t] for t in PLAYABLE_TYPES]
+        return observation
+
+    def info(self, spawned: bool = False) -> dict:
+        game = self.session.game
+        return {
+            "rooms_cleared": game.rooms_cleared,
+            "entities": len(game.all_entities),
+            "spawned": spawned,
+            "steps": self.steps,
+        }
+
+
+class VectorStormEnv:
+    # num_envs independent StormEnvs stepped in lockstep in this process, with batched arrays:
+    #   observations, infos = envs.reset(seed=0)  # env i uses seed + i
+    #   observations, rewards, terminated, truncated, infos = envs.step(actions)
+    # Observations have a leading num_envs axis and are written into the same arrays every step, so copy
+    # them to keep them. An env whose episode ended is reset straight away with the next unused seed: the
+    # observation returned for it is the first of its new episode and its info holds "final_observation"
+    # and "final_info" of the one that ended.
+    def __init__(self, num_envs: int, **env_options):
+        self.envs = [StormEnv(**env_options) for _ in range(num_envs)]
+        self.observations = self.envs[0].empty_observation((num_envs,))
+        self.next_seed = None
+
+    @property
+    def num_envs(self) -> int:
+        return len(self.envs)
+
+    def __row(self, i: int) -> dict:
+        return {name: array[i] for name, array in self.observations.items()}
+
+    def __seed(self) -> int | None:
+        seed = self.next_seed
+        if seed is not None:
+            self.next_seed += 1
+        return seed
+
+    def reset(self, seed: int | None = None) -> tuple[dict, list[dict]]:
+        self.next_seed = seed
+        infos = []
+        for i, env in enumerate(self.envs):
+            env.reset(self.__seed())
+            env.observe(self.__row(i))
+            infos.append(env.info())
+        return self.observations, infos
+
+    def step(self, actions) -> tuple[dict, "np.ndarray", "np.ndarray", "np.ndarray", list[dict]]:
+        rewards = np.zeros(self.num_envs, dtype=np.int32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            row = self.__row(i)
+            _, rewards[i], terminated[i], truncated[i], info = env.step(action)
+            if terminated[i] or truncated[i]:
+                final_observation = {name: array.copy() for name, array in env.observe().items()}
+                env.reset(self.__seed())
+                info = env.info() | {"final_observation": final_observation, "final_info": info}
+            env.observe(row)
+            infos.append(info)
+        return self.observations, rewards, terminated, truncated, infos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure environment steps per second with a random placement policy.")
+    parser.add_argument("--envs", type=int, default=8, help="games stepped in lockstep")
+    parser.add_argument("--steps", type=int, default=10_000, help="vector steps, each one step of every game")
+    parser.add_argument("--ticks-per-step", type=int, default=4, help="simulation ticks per environment step")
+    parser.add_argument("--spawn-chance", type=float, default=0.05, help="chance that a step places a unit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", action="store_true", help="use the NumPy combat engine")
+    headless.add_flow_field_argument(parser)
+    args = parser.parse_args()
+
+    envs = VectorStormEnv(
+        args.envs,
+        ticks_per_step=args.ticks_per_step,
+        use_combat_engine=args.engine,
+        use_flow_field=args.flow_field,
+    )
+    rng = np.random.default_rng(args.seed)
+    envs.reset(seed=args.seed)
+    episodes = 0
+    rooms_cleared = 0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        spawn = rng.random(envs.num_envs) < args.spawn_chance
+        actions = np.where(spawn, rng.integers(1, StormEnv.action_count, envs.num_envs), 0)
+        _, rewards, terminated, truncated, _ = envs.step(actions)
+        episodes += int(np.count_nonzero(terminated | truncated))
+        rooms_cleared += int(rewards.sum())
+    elapsed = time.perf_counter() - start
+
+    env_steps = args.steps * envs.num_envs
+    print(json.dumps({
+        "envs": envs.num_envs,
+        "env_steps": env_steps,
+        "ticks_per_step": args.ticks_per_step,
+        "episodes_finished": episodes,
+        "rooms_cleared": rooms_cleared,
+        "elapsed_seconds": round(elapsed, 3),
+        "env_steps_per_second": round(env_steps / elapsed) if elapsed else None,
+    }, indent=2))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
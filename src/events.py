@@ -0,0 +1,46 @@
+from collections import defaultdict
+from typing import Any, Callable
+
+# Topics published by the game
+STAT_CHANGED = "stat_changed"  # unit_type, stat, value
+PLAYABLE_UNITS_CHANGED = "playable_units_changed"  # unit_type, count
+ROOMS_CLEARED_CHANGED = "rooms_cleared_changed"  # value
+SHOW_NOTIFICATION = "show_notification"  # text
+
+
+class EventBus:
+    # Minimal publish/subscribe hub. Subscribers are called synchronously with the event's keyword data.
+    # subscribe() returns a function that removes the subscription again.
+    # Examples: unsubscribe = bus.subscribe(STAT_CHANGED, lambda unit_type, stat, value: ...)
+    #           bus.subscribe_all(lambda topic, **data: print(topic, data))
+    def __init__(self):
+        self.subscribers: defaultdict[str, list[Callable[..., Any]]] = defaultdict(list)
+        self.global_subscribers: list[Callable[..., Any]] = []
+
+    def subscribe(self, topic: str, callback: Callable[..., Any]) -> Callable[[], None]:
+        self.subscribers[topic].append(callback)
+        return lambda: self.subscribers[topic].remove(callback)
+
+    def subscribe_all(self, callback: Callable[..., Any]) -> Callable[[], None]:
+        # For logging and telemetry: gets every topic, with the topic name as the first argument
+        self.global_subscribers.append(callback)
+        return lambda: self.global_subscribers.remove(callback)
+
+    def publish(self, topic: str, **data):
+        for callback in list(self.subscribers.get(topic, ())):
+            callback(**data)
+        for callback in list(self.global_subscribers):
+            callback(topic, **data)
+
+
+class ObservableDict(dict):
+    # A dict that publishes on_set(key, value) whenever an item is assigned
+    def __init__(self, on_set: Callable[[Any, Any], None], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_set = on_set
+
+    def __setitem__(self, key, value):
+        changed = self.get(key) != value
+        super().__setitem__(key, value)
+        if changed:
+            self.on_set(key, value)
@@ -0,0 +1,139 @@
+import heapq
+
+import pygame
+from pygame import Surface
+from pygame.math import Vector2
+from pygame.sprite import Group, Sprite
+
+from consts import *
+
+
+class FlowField:
+    # Shared navigation for every unit chasing the sprites of `group`, over a coarse grid of the play area
+    # (y >= PLAY_AREA_TOP). A multi-source Dijkstra search from the cells the sprites are in labels every
+    # cell with the sprite nearest to its center: labels spread to neighbouring cells ranked by the real
+    # distance from each cell's center to the sprite, not by grid steps. target() then picks the nearest of
+    # the sprites labelling the cells around a position, measured from the position itself, so a unit finds
+    # its target with a few lookups instead of a distance scan. With no obstacles on the field the path to
+    # that target is a straight line, so cells hold no direction and units steer straight at their target.
+    # This is the nearest opponent in nearly every case; when two are almost equally far the field can
+    # still pick the other one, so the same seed doesn't always play out as without a field.
+    # update() must be called before the units move; it only searches again when a sprite changed cell,
+    # appeared or died. Cells outside the play area use the nearest cell inside it.
+    def __init__(self, group: Group, cell_size: int = FLOW_FIELD_CELL_SIZE):
+        self.group = group
+        self.cell_size = cell_size
+        self.cols = -(-SCREEN_WIDTH // cell_size)
+        self.rows = -(-(SCREEN_HEIGHT - PLAY_AREA_TOP) // cell_size)
+        self.neighbours = [self.__neighbours(i) for i in range(self.cols * self.rows)]
+        half = cell_size // 2
+        self.centers = [
+            ((i % self.cols) * cell_size + half, (i // self.cols) * cell_size + half + PLAY_AREA_TOP)
+            for i in range(self.cols * self.rows)
+        ]
+        self.targets: list[Sprite | None] = [None] * (self.cols * self.rows)
+        # Group order of every sprite in the field, ties go to the first, and the sprites in each cell by
+        # the cell of one of them
+        self.order: dict[Sprite, int] = {}
+        self.cellmates: dict[Sprite, list[Sprite]] = {}
+        self.sources: list[tuple[int, Sprite]] = []
+        self.rebuilds = 0
+
+    def __bool__(self):
+        return bool(self.group)
+
+    def __neighbours(self, index: int) -> list[int]:
+        # 8-connected
+        col, row = index % self.cols, index // self.cols
+        found = []
+        for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]:
+            x, y = col + dx, row + dy
+            if 0 <= x < self.cols and 0 <= y < self.rows:
+                found.append(y * self.cols + x)
+        return found
+
+    def cell(self, pos: tuple[int, int]) -> int:
+        col = min(max(int(pos[0]) // self.cell_size, 0), self.cols - 1)
+        row = min(max((int(pos[1]) - PLAY_AREA_TOP) // self.cell_size, 0), self.rows - 1)
+        return row * self.cols + col
+
+    def update(self) -> bool:
+        # Returns whether the field was searched again
+        sources = [(self.cell(sprite.rect.center), sprite) for sprite in self.group]
+        if sources == self.sources:
+            return False
+        self.sources = sources
+        self.rebuilds += 1
+
+        centers = self.centers
+        neighbours = self.neighbours
+        targets = [None] * len(self.targets)
+        # Squared distance from each cell's center to its target, and its target's group order
+        best = [(float("inf"), 0)] * len(self.targets)
+        self.order = {}
+        occupants = {}
+        heap = []
+        for order, (index, sprite) in enumerate(sources):
+            self.order[sprite] = order
+            occupants.setdefault(index, []).append(sprite)
+            x, y = sprite.rect.center
+            cx, cy = centers[index]
+            key = ((cx - x) ** 2 + (cy - y) ** 2, order)
+            if key < best[index]:
+                best[index] = key
+                targets[index] = sprite
+                heapq.heappush(heap, (key, index))
+        while heap:
+            key, index = heapq.heappop(heap)
+            if key != best[index]:
+                continue
+            target = targets[index]
+            order = key[1]
+            x, y = target.rect.center
+            for neighbour in neighbours[index]:
+                cx, cy = centers[neighbour]
+                key = ((cx - x) ** 2 + (cy - y) ** 2, order)
+                if key < best[neighbour]:
+                    best[neighbour] = key
+                    targets[neighbour] = target
+                    heapq.heappush(heap, (key, neighbour))
+        self.targets = targets
+        self.cellmates = {sprite: occupants[index] for index, sprite in sources}
+        return True
+
+    def target(self, pos: tuple[int, int]) -> Sprite | None:
+        # The nearest live sprite among those labelling the cell at pos or one around it, and the sprites
+        # sharing a cell with them, which a cell's label hides
+        index = self.cell(pos)
+        targets = self.targets
+        x, y = pos
+        seen = set()
+        found = None
+        found_key = None
+        for cell in (index, *self.neighbours[index]):
+            label = targets[cell]
+            if label is None or label in seen:
+                continue
+            for target in self.cellmates[label]:
+                seen.add(target)
+                if target not in self.group:
+                    continue
+                tx, ty = target.rect.center
+                key = ((tx - x) ** 2 + (ty - y) ** 2, self.order[target])
+                if found is None or key < found_key:
+                    found = target
+                    found_key = key
+        return found
+
+    def draw(self, screen: Surface, color=(255, 255, 0)):
+        # Debug overlay: a short line from each cell's center toward the sprite the cell leads to
+        half = self.cell_size / 2
+        for index, target in enumerate(self.targets):
+            if target is None:
+                continue
+            center = Vector2((index % self.cols) * self.cell_size + half, (index // self.cols) * self.cell_size + half + PLAY_AREA_TOP)
+            direction = Vector2(target.rect.center) - center
+            if direction:
+                direction.scale_to_length(half * 0.8)
+            pygame.draw.line(screen, color, center, center + direction)
+            pygame.draw.circle(screen, color, center, 1)
@@ -0,0 +1,383 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Must be set before pygame initializes its video and audio subsystems
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from assets import registry, text_cache
+from consts import *
+from main import GameState
+from pools import pool_stats
+from replay import checksum
+from sprites import Warrior, Ranger, Mage, preload_assets
+
+PLAYABLE_TYPES = {unit_type.__name__: unit_type for unit_type in [Warrior, Ranger, Mage]}
+
+
+def init_headless() -> pygame.Surface:
+    # Sets up pygame with no window or sound card. Returns the (never presented) screen surface,
+    # which is still needed so images can be converted and the game can clamp units to it.
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    preload_assets()
+    return screen
+
+
+def start_game(
+    units: dict[type, int],
+    use_combat_engine: bool = False,
+    settings: dict | None = None,
+    use_flow_field: bool = FLOW_FIELD_NAVIGATION,
+    seed: int | None = None,
+    muted: bool = True,
+) -> GameState:
+    # Starts a fresh run with the given party, as if it had been picked on the title screen.
+    # settings overrides GameState attributes before the first room, e.g. {"enemy_scaling_interval": 2}
+    game = GameState(
+        GameState.States.TITLE_SCREEN, use_combat_engine=use_combat_engine, use_flow_field=use_flow_field, seed=seed, muted=muted
+    )
+    game.playable_units = dict(units)
+    for name, value in (settings or {}).items():
+        setattr(game, name, value)
+    game.transition_state(GameState.States.GAME_SCREEN)
+    return game
+
+
+def deploy_all(game: GameState, rng: random.Random):
+    # Default policy: at the start of each room, place every available unit somewhere in the bottom third
+    for unit_type, count in game.playable_units.items():
+        game.selected_unit = unit_type
+        for _ in range(count * 10):
+            if game.playable_units[unit_type] == 0:
+                break
+            game.spawn_playable_unit((rng.randint(0, SCREEN_WIDTH), rng.randint(SCREEN_HEIGHT * 2 // 3, SCREEN_HEIGHT)))
+
+
+class Session:
+    # One headless game stepped by hand, with a fixed delta_time per step and no drawing. Games don't share
+    # any state, so several sessions can be stepped in turn in one process (see check_isolation). They can
+    # also be stepped on several threads, since they're muted by default and the sprite pools are locked, but
+    # check_isolation doesn't cover that. Unmuted sessions play their sounds through the dummy audio driver
+    # and share pygame's one music stream, so they must stay on one thread.
+    # actions is a list of scripted spawns: {"step": 120, "unit": "Ranger", "pos": [400, 500]}
+    def __init__(
+        self,
+        units: dict[type, int],
+        actions: list[dict] = (),
+        delta_time: int = SIMULATION_STEP,
+        seed: int | None = None,
+        auto_deploy: bool = True,
+        use_combat_engine: bool = False,
+        settings: dict | None = None,
+        use_flow_field: bool = FLOW_FIELD_NAVIGATION,
+        muted: bool = True,
+    ):
+        self.delta_time = delta_time
+        self.auto_deploy = auto_deploy
+        self.deploy_rng = random.Random(seed)
+        self.pending = sorted(actions, key=lambda action: action["step"])
+        self.next_action = 0
+        self.steps = 0
+        self.game = start_game(units, use_combat_engine, settings, use_flow_field, seed, muted)
+
+    def step(self, screen: pygame.Surface):
+        game = self.game
+        while self.next_action < len(self.pending) and self.pending[self.next_action]["step"] <= self.steps:
+            action = self.pending[self.next_action]
+            game.selected_unit = PLAYABLE_TYPES[action["unit"]]
+            game.spawn_playable_unit(tuple(action["pos"]))
+            self.next_action += 1
+        if self.auto_deploy and not game.all_players and game.room_transition_timer is None:
+            deploy_all(game, self.deploy_rng)
+
+        game.update(screen, self.delta_time)
+        self.steps += 1
+
+    def finished(self, max_rooms: int | None = None) -> bool:
+        if self.game.screen_state != GameState.States.GAME_SCREEN:
+            return True
+        return max_rooms is not None and self.game.rooms_cleared >= max_rooms
+
+    def result(self) -> dict:
+        return {
+            "rooms_cleared": self.game.rooms_cleared,
+            "game_over": self.game.screen_state == GameState.States.GAME_OVER,
+            "steps": self.steps,
+            "simulated_seconds": self.steps * self.delta_time / 1000,
+            "audio": self.game.audio.stats(),
+        }
+
+
+def simulate(
+    screen: pygame.Surface,
+    units: dict[type, int],
+    actions: list[dict] = (),
+    delta_time: int = SIMULATION_STEP,
+    max_steps: int = 100_000,
+    max_rooms: int | None = None,
+    seed: int | None = None,
+    auto_deploy: bool = True,
+    use_combat_engine: bool = False,
+    settings: dict | None = None,
+    use_flow_field: bool = FLOW_FIELD_NAVIGATION,
+    muted: bool = True,
+) -> dict:
+    # Runs one game until the party is wiped out, max_rooms rooms are cleared, or max_steps steps have run
+    session = Session(units, actions, delta_time, seed, auto_deploy, use_combat_engine, settings, use_flow_field, muted)
+    start = time.perf_counter()
+    while session.steps < max_steps:
+        session.step(screen)
+        if session.finished(max_rooms):
+            break
+    elapsed = time.perf_counter() - start
+
+    return session.result() | {
+        "elapsed_seconds": round(elapsed, 3),
+        "steps_per_second": round(session.steps / elapsed) if elapsed else None,
+    }
+
+
+def check_isolation(
+    screen: pygame.Surface,
+    units: dict[type, int],
+    seeds: list[int],
+    delta_time: int = SIMULATION_STEP,
+    max_steps: int = 100_000,
+    max_rooms: int | None = None,
+    use_combat_engine: bool = False,
+    use_flow_field: bool = FLOW_FIELD_NAVIGATION,
+) -> dict:
+    # Plays one game per seed on its own, then all of them again interleaved one step at a time, and
+    # compares the outcome, unit stats and final state of each. Any difference means games leak state
+    # into each other. Seeds may repeat. Everything runs on the calling thread, so this says nothing about
+    # games stepped on several threads at once.
+    def outcome(session: Session) -> dict:
+        return session.result() | {"stats": session.game.stats.snapshot(), "checksum": checksum(session.game)}
+
+    def new_session(seed: int) -> Session:
+        return Session(units, delta_time=delta_time, seed=seed, use_combat_engine=use_combat_engine, use_flow_field=use_flow_field)
+
+    solo = []
+    for seed in seeds:
+        session = new_session(seed)
+        while session.steps < max_steps and not session.finished(max_rooms):
+            session.step(screen)
+        solo.append(outcome(session))
+
+    sessions = [new_session(seed) for seed in seeds]
+    running = list(sessions)
+    while running:
+        for session in running:
+            session.step(screen)
+        running = [s for s in running if s.steps < max_steps and not s.finished(max_rooms)]
+    interleaved = [outcome(session) for session in sessions]
+
+    mismatches = [
+        {"seed": seed, "solo": alone, "interleaved": together}
+        for seed, alone, together in zip(seeds, solo, interleaved)
+        if alone != together
+    ]
+    return {
+        "sessions": len(seeds),
+        "rooms_cleared": [result["rooms_cleared"] for result in solo],
+        "isolated": not mismatches,
+        "mismatches": mismatches,
+    }
+
+
+def check_engine(
+    screen: pygame.Surface,
+    units: dict[type, int],
+    seeds: list[int],
+    delta_time: int = SIMULATION_STEP,
+    max_steps: int = 100_000,
+    max_rooms: int | None = None,
+    room_size: int | None = None,
+) -> dict:
+    # Plays each seed with the per-sprite combat and with the NumPy combat engine side by side, one step at
+    # a time, and compares the state of the two games after every step. Sounds are muted, so the two
+    # paths must agree exactly; the first step where they don't is reported for each seed. The engine
+    # always targets the nearest opponent by distance, so flow fields are off for both.
+    # With room_size, each seed plays a single room of room_size party units against room_size enemies,
+    # set up like bench.py's rooms and played until it is cleared or lost, instead of a game from the
+    # title screen. Big enough rooms go through the engine's CellGrid, which small games never reach.
+    from bench import build_room
+
+    mismatches = []
+    rooms_cleared = []
+    for seed in seeds:
+        if room_size is None:
+            sessions = [
+                Session(units, delta_time=delta_time, seed=seed, use_combat_engine=use_engine, use_flow_field=False)
+                for use_engine in (False, True)
+            ]
+            games = [session.game for session in sessions]
+
+            def step():
+                for session in sessions:
+                    session.step(screen)
+
+            def finished() -> bool:
+                return sessions[0].finished(max_rooms)
+        else:
+            party = {Warrior: room_size * 2 // 5, Ranger: room_size * 2 // 5, Mage: room_size - room_size * 2 // 5 * 2}
+            games = [build_room(party, room_size, {"use_combat_engine": use_engine}, seed) for use_engine in (False, True)]
+
+            def step():
+                for game in games:
+                    game.update(screen, delta_time)
+
+            def finished() -> bool:
+                return games[0].screen_state != GameState.States.GAME_SCREEN or games[0].room_transition_timer is not None
+
+        steps = 0
+        while True:
+            step()
+            steps += 1
+            if checksum(games[0]) != checksum(games[1]):
+                mismatches.append({
+                    "seed": seed,
+                    "step": steps,
+                    "sprites": {"rooms_cleared": games[0].rooms_cleared, "entities": len(games[0].all_entities)},
+                    "engine": {"rooms_cleared": games[1].rooms_cleared, "entities": len(games[1].all_entities)},
+                })
+                break
+            if steps >= max_steps or finished():
+                break
+        rooms_cleared.append(games[0].rooms_cleared)
+    return {
+        "sessions": len(seeds),
+        "rooms_cleared": rooms_cleared,
+        "identical": not mismatches,
+        "mismatches": mismatches,
+    }
+
+
+def parse_units(text: str) -> dict[type, int]:
+    # "2,2,1" -> 2 Warriors, 2 Rangers and 1 Mage
+    counts = [int(count) for count in text.split(",")]
+    return dict(zip([Warrior, Ranger, Mage], counts + [0] * (3 - len(counts))))
+
+
+def add_flow_field_argument(parser: argparse.ArgumentParser):
+    # --flow-field / --no-flow-field, shared by every command line that plays games
+    parser.add_argument(
+        "--flow-field",
+        action=argparse.BooleanOptionalAction,
+        default=FLOW_FIELD_NAVIGATION,
+        help=f"navigate with flow fields (default: {FLOW_FIELD_NAVIGATION})",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Storm the Castle without a window, as fast as possible.")
+    parser.add_argument("--units", default="2,2,1", help="starting Warriors,Rangers,Mages (default: 2,2,1)")
+    parser.add_argument("--runs", type=int, default=1, help="number of games to play")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, later games use seed+1, ...")
+    parser.add_argument("--dt", type=int, default=SIMULATION_STEP, help="milliseconds simulated per step")
+    parser.add_argument("--max-steps", type=int, default=100_000, help="step limit per game")
+    parser.add_argument("--max-rooms", type=int, default=None, help="stop a game after this many rooms")
+    parser.add_argument("--script", help="JSON file with a list of scripted spawns")
+    parser.add_argument("--no-auto-deploy", action="store_true", help="only spawn units from --script")
+    parser.add_argument("--engine", action="store_true", help="use the NumPy combat engine")
+    add_flow_field_argument(parser)
+    parser.add_argument(
+        "--sound",
+        action="store_true",
+        help="play sounds through the dummy audio driver, to see what the voice manager does with them. "
+        "Picking sounds uses the game's random numbers, so runs differ from muted ones",
+    )
+    parser.add_argument(
+        "--check-isolation",
+        action="store_true",
+        help="play the --runs games alone and then interleaved on one thread, and fail if any of them differ",
+    )
+    parser.add_argument(
+        "--check-engine",
+        action="store_true",
+        help="play the --runs games with and without the combat engine side by side, and fail if they ever differ",
+    )
+    parser.add_argument(
+        "--room-size",
+        type=int,
+        help="with --check-engine, play one room of this many party units against as many enemies per run instead",
+    )
+    args = parser.parse_args()
+    if args.dt != SIMULATION_STEP:
+        # The game is only ever played at SIMULATION_STEP ticks: other steps move units a different
+        # distance per update and give numbers that don't match real play
+        print(f"warning: --dt {args.dt} is not SIMULATION_STEP ({SIMULATION_STEP} ms)", file=sys.stderr)
+
+    actions = []
+    if args.script:
+        with open(args.script) as f:
+            actions = json.load(f)
+
+    screen = init_headless()
+    if args.check_isolation:
+        report = check_isolation(
+            screen,
+            parse_units(args.units),
+            [args.seed + run for run in range(args.runs)],
+            delta_time=args.dt,
+            max_steps=args.max_steps,
+            max_rooms=args.max_rooms,
+            use_combat_engine=args.engine,
+            use_flow_field=args.flow_field,
+        )
+        print(json.dumps(report, indent=2))
+        pygame.quit()
+        sys.exit(0 if report["isolated"] else 1)
+    if args.check_engine:
+        report = check_engine(
+            screen,
+            parse_units(args.units),
+            [args.seed + run for run in range(args.runs)],
+            delta_time=args.dt,
+            max_steps=args.max_steps,
+            max_rooms=args.max_rooms,
+            room_size=args.room_size,
+        )
+        print(json.dumps(report, indent=2))
+        pygame.quit()
+        sys.exit(0 if report["identical"] else 1)
+
+    results = [
+        simulate(
+            screen,
+            parse_units(args.units),
+            actions,
+            delta_time=args.dt,
+            max_steps=args.max_steps,
+            max_rooms=args.max_rooms,
+            seed=args.seed + run,
+            auto_deploy=not args.no_auto_deploy,
+            use_combat_engine=args.engine,
+            use_flow_field=args.flow_field,
+            muted=not args.sound,
+        )
+        for run in range(args.runs)
+    ]
+    total_steps = sum(r["steps"] for r in results)
+    total_elapsed = sum(r["elapsed_seconds"] for r in results)
+    print(json.dumps({
+        "runs": results,
+        "rooms_cleared": sum(r["rooms_cleared"] for r in results),
+        "steps": total_steps,
+        "steps_per_second": round(total_steps / total_elapsed) if total_elapsed else None,
+        "pools": pool_stats(),
+        "assets": registry.stats(),
+        "text_cache": text_cache.stats(),
+    }, indent=2))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import argparse
+from collections import deque
 import enum
 import pygame
 from pygame.locals import (
@@ -10,10 +12,22 @@ from pygame.locals import (
     K_3,
     K_i,
     K_m,
+    K_F3,
+    K_F4,
 )
 import random
 
+from assets import BackgroundLoader, registry, text_cache
+from audio import VoiceManager
+from bundle import AssetBundle
+from combat import CombatEngine
 from consts import *
+from events import EventBus, ObservableDict, STAT_CHANGED, PLAYABLE_UNITS_CHANGED, ROOMS_CLEARED_CHANGED, SHOW_NOTIFICATION
+from flowfield import FlowField
+from profiler import FrameProfiler, ProfilerOverlay
+from render import DirtyRenderer, ScaledFramebuffer
+from replay import Recorder
+from spatial import SpatialHash
 from sprites import (
     Skeleton,
     Zombie,
@@ -26,8 +40,18 @@ from sprites import (
     Mage,
     Chest,
     Button,
+    Unit,
+    asset_loaders,
+    interpolated_offset,
+    new_stat_table,
 )
 
+# Images of the play buttons on the title and game over screens, and the sizes they're drawn at
+PLAY_BUTTON_IMAGE = "title_screen/play_button.png"
+PLAY_BUTTON_SIZE = (160, 80)
+PLAY_AGAIN_BUTTON_IMAGE = "game_over/play_again.png"
+PLAY_AGAIN_BUTTON_SIZE = (427, 108)
+
 
 class GameState:
     class States(enum.Enum):
@@ -35,10 +59,41 @@ class GameState:
         GAME_SCREEN = enum.auto()
         GAME_OVER = enum.auto()
 
-    def __init__(self, state: States):
+    # Track, volume and loops of each screen's music
+    MUSIC = {
+        States.TITLE_SCREEN: ("music/title_screen.ogg", 0.20, -1),
+        States.GAME_SCREEN: ("music/gameplay.ogg", 0.20, -1),
+        States.GAME_OVER: ("music/gameover.ogg", 0.30, 0),
+    }
+
+    def __init__(
+        self,
+        state: States,
+        use_combat_engine: bool = False,
+        dirty_rendering: bool = False,
+        use_flow_field: bool = False,
+        seed: int | None = None,
+        render_scale: float = 1.0,
+        muted: bool = False,
+    ):
         # Set initial values for game states
         self.screen_state = state
-        self.font = pygame.font.Font(ASSETS_DIR / "font" / "morris-roman.black.ttf", 24)
+        self.font = registry.font("font/morris-roman.black.ttf", 24)
+
+        # Every random roll of the game comes from here, so a seed replays the same game even with
+        # other games running in the same process
+        self.random = random.Random(seed)
+
+        # Publishes changes to playable_units, rooms_cleared and unit stats, and the notifications to show.
+        # Notifications go through it rather than pygame's event queue, which every game in the process shares.
+        self.events = EventBus()
+        self.events.subscribe(SHOW_NOTIFICATION, self.__show_notification)
+        # This game's unit stats, referenced by every unit it spawns
+        self.stats = new_stat_table(self.events)
+        # Subscriptions made by the current screen's widgets, dropped when the screen is rebuilt
+        self.screen_subscriptions = []
+        # Widgets of every screen visited so far: (texts, stats texts, (topic, text) bindings)
+        self.screen_widgets = {}
 
         self.selected_unit = Warrior
         self.playable_units = {Warrior: 0, Ranger: 0, Mage: 0}
@@ -48,8 +103,19 @@ class GameState:
         self.lower_bound = 1
         self.upper_bound = 1
 
+        # Difficulty curve, can be changed per game for balance simulations
+        self.enemy_scaling_interval = ENEMY_SCALING_INTERVAL
+        self.room_growth_interval = ROOM_GROWTH_INTERVAL
+        self.reinforcement_interval = REINFORCEMENT_INTERVAL
+
         self.show_stats = False
 
+        # Frame time not yet simulated, and how far the drawn frame is between the last two ticks
+        self.accumulator = 0
+        self.interpolation = 1.0
+        self.ticks = 0
+        self.skipped_time = 0
+
         self.all_enemies = pygame.sprite.Group()
         self.all_players = pygame.sprite.Group()
         self.all_text = pygame.sprite.Group()
@@ -57,54 +123,122 @@ class GameState:
         self.stats_text = pygame.sprite.Group()
         self.all_notifications = pygame.sprite.Group()
 
-        self.title_screen = pygame.image.load(ASSETS_DIR / "title_screen/title.png").convert()
-        self.room_bg = pygame.image.load(ASSETS_DIR / "background.png").convert()
-        self.game_over_bg = pygame.image.load(ASSETS_DIR / "game_over" / "background.png").convert()
-        self.play_button_sound = pygame.mixer.Sound(ASSETS_DIR / "sounds" / "button" / "play_again.ogg")
-        self.play_button_sound.set_volume(0.5)
+        # Broad phase for targeting, rebuilt each tick before the opposing side updates
+        self.player_grid = SpatialHash(self.all_players)
+        self.enemy_grid = SpatialHash(self.all_enemies)
+        # Where each side should head, named like the grids after the sprites they lead to
+        self.enemy_field = FlowField(self.all_enemies) if use_flow_field else None
+        self.player_field = FlowField(self.all_players) if use_flow_field else None
+        self.show_flow_field = False
+
+        # Optional NumPy engine that runs combat for every unit at once, needs numpy
+        self.combat_engine = CombatEngine(self.all_players, self.all_enemies, self.stats) if use_combat_engine else None
+
+        self.title_screen = registry.image("title_screen/title.png", alpha=False)
+        self.room_bg = registry.image("background.png", alpha=False)
+        self.game_over_bg = registry.image("game_over/background.png", alpha=False)
+        self.play_button_sound = registry.sound("sounds/button/play_again.ogg", 0.5)
+
+        # Phase timings, recorded while the overlay is shown or a trace was asked for
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.profiler_overlay = ProfilerOverlay(registry.font("font/morris-roman.black.ttf", 16), pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+
+        self.audio = VoiceManager(profiler=self.profiler)
 
         self.bg_surf = self.room_bg
 
-        self.muted = False
+        # Muted games never touch pygame's music stream, which every game in the process shares
+        self.muted = muted
+
+        # Draw each frame at a lower resolution and stretch it over the window
+        self.framebuffer = ScaledFramebuffer(render_scale) if render_scale != 1 else None
+
+        # Only repaint what changed each frame instead of the whole screen. The stretched frame always
+        # covers the whole window, so this is off with a render scale.
+        self.dirty_renderer = DirtyRenderer() if dirty_rendering and self.framebuffer is None else None
 
         self.build_screen()
 
+    @property
+    def playable_units(self) -> dict:
+        return self.__playable_units
+
+    @playable_units.setter
+    def playable_units(self, units: dict):
+        self.__playable_units = ObservableDict(self.__publish_playable_units, units)
+        for unit_type, count in units.items():
+            self.__publish_playable_units(unit_type, count)
+
+    def __publish_playable_units(self, unit_type, count):
+        self.events.publish(PLAYABLE_UNITS_CHANGED, unit_type=unit_type, count=count)
+
+    @property
+    def rooms_cleared(self) -> int:
+        return self.__rooms_cleared
+
+    @rooms_cleared.setter
+    def rooms_cleared(self, value: int):
+        self.__rooms_cleared = value
+        self.events.publish(ROOMS_CLEARED_CHANGED, value=value)
+
+    def watch(self, bus: EventBus, topic: str, callback):
+        # Subscribes a widget of the current screen; the subscription ends when the screen is rebuilt
+        self.screen_subscriptions.append(bus.subscribe(topic, callback))
+
     def generate_room(self):
         for entity in self.all_enemies:
             entity.kill()
+        if self.combat_engine is not None:
+            self.combat_engine.invalidate()
 
         if self.rooms_cleared == 1:
             self.upper_bound += 2
 
-        if self.rooms_cleared % 5 == 0 and self.rooms_cleared != 0:
+        if self.rooms_cleared % self.room_growth_interval == 0 and self.rooms_cleared != 0:
             self.lower_bound += 1
             self.upper_bound += 1
 
-        for _ in range(random.randint(self.lower_bound, self.upper_bound)):
-            random.choice([Skeleton, Zombie])((random.randint(0, SCREEN_WIDTH), random.randint(75, SCREEN_HEIGHT)), self.all_enemies, self.all_entities)
-        if random.random() < CHEST_SPAWN_CHANCE:
-            Chest(
-                (random.randint(0, SCREEN_WIDTH), random.randint(75, SCREEN_HEIGHT)),
+        rng = self.random
+        for _ in range(rng.randint(self.lower_bound, self.upper_bound)):
+            rng.choice([Skeleton, Zombie]).spawn((rng.randint(0, SCREEN_WIDTH), rng.randint(PLAY_AREA_TOP, SCREEN_HEIGHT)), self.stats, self.all_enemies, self.all_entities)
+        if rng.random() < CHEST_SPAWN_CHANCE:
+            Chest.spawn(
+                (rng.randint(0, SCREEN_WIDTH), rng.randint(PLAY_AREA_TOP, SCREEN_HEIGHT)),
+                self.stats,
+                rng,
                 self.all_enemies,
                 self.all_entities,
             )
 
     def spawn_playable_unit(self, pos):
-        if pos[1] >= 75 and not any(e.rect.collidepoint(pos) for e in self.all_enemies):
+        if pos[1] >= PLAY_AREA_TOP and not any(e.rect.collidepoint(pos) for e in self.all_enemies):
             if self.playable_units[self.selected_unit] > 0:
                 self.playable_units[self.selected_unit] -= 1
-                self.selected_unit(pos, self.all_players, self.all_entities)
+                if self.combat_engine is not None:
+                    self.combat_engine.invalidate()
+                self.selected_unit.spawn(pos, self.stats, self.all_players, self.all_entities)
+
+    def select_unit(self, unit_type: type[Unit]):
+        self.selected_unit = unit_type
+        self.warrior_text.set_color(GREEN if unit_type is Warrior else BLACK)
+        self.ranger_text.set_color(GREEN if unit_type is Ranger else BLACK)
+        self.mage_text.set_color(GREEN if unit_type is Mage else BLACK)
 
     def transition_state(self, new_state: States):
         self.screen_state = new_state
         self.build_screen()
 
+    def __show_notification(self, text: str):
+        if self.screen_state == GameState.States.GAME_SCREEN:
+            self.add_notification(text)
+
     def add_notification(self, text: str):
         centerpos = (SCREEN_WIDTH / 2, 45)
         for notif in self.all_notifications:
             if notif.rect.collidepoint(centerpos):
                 centerpos = (SCREEN_WIDTH / 2, notif.rect.centery + notif.rect.h)
-        TimedTextArea(
+        TimedTextArea.spawn(
             self.font,
             text,
             BLACK,
@@ -115,15 +249,57 @@ class GameState:
         )
 
     def build_screen(self):
+        # Clears the field and shows the current screen. Each screen's widgets are built on its first visit
+        # and reused on later ones, when only the texts that show game values are refreshed.
         self.all_players.empty()
         self.all_enemies.empty()
         self.all_entities.empty()
         self.all_text.empty()
         self.stats_text.empty()
         self.all_notifications.empty()
+        for unsubscribe in self.screen_subscriptions:
+            unsubscribe()
+        self.screen_subscriptions.clear()
+        if self.combat_engine is not None:
+            self.combat_engine.invalidate()
+
         if self.screen_state == GameState.States.TITLE_SCREEN:
             self.bg_surf = self.title_screen
+        elif self.screen_state == GameState.States.GAME_SCREEN:
+            self.bg_surf = self.room_bg
+            self.rooms_cleared = 0
+        elif self.screen_state == GameState.States.GAME_OVER:
+            self.bg_surf = self.game_over_bg
+
+        widgets = self.screen_widgets.get(self.screen_state)
+        if widgets is None:
+            bindings = self.__build_widgets()
+            widgets = self.screen_widgets[self.screen_state] = (self.all_text.sprites(), self.stats_text.sprites(), bindings)
+        texts, stats_texts, bindings = widgets
+        self.all_text.add(texts)
+        self.stats_text.add(stats_texts)
+        for topic, text in bindings:
+            self.watch(self.events, topic, text.refresh)
+            text.refresh()
+
+        if self.screen_state == GameState.States.GAME_SCREEN:
+            self.select_unit(self.selected_unit)
+            self.generate_room()
 
+        if not self.muted:
+            self.__play_music()
+
+    def __play_music(self):
+        track, volume, loops = GameState.MUSIC[self.screen_state]
+        pygame.mixer.music.load(registry.music(track), Path(track).name)
+        pygame.mixer.music.set_volume(volume)
+        pygame.mixer.music.play(loops=loops)
+
+    def __build_widgets(self) -> list[tuple[str, UpdatableTextArea]]:
+        # Creates the current screen's widgets in all_text and stats_text. Returns the texts to refresh
+        # on the event bus while the screen is shown, as (topic, text) pairs.
+        bindings = []
+        if self.screen_state == GameState.States.TITLE_SCREEN:
             TextArea(
                 self.font,
                 "[M] Mute music/sounds",
@@ -161,6 +337,7 @@ class GameState:
                     self.all_text,
                     topleft=class_left_arrow.rect.move(10, 0).topright,
                 )
+                bindings.append((PLAYABLE_UNITS_CHANGED, class_count_text))
                 TitleScreenArrow(
                     1,
                     class_type,
@@ -169,20 +346,13 @@ class GameState:
                 )
 
             Button(
-                (160, 80),
-                ASSETS_DIR / "title_screen" / "play_button.png",
+                PLAY_BUTTON_SIZE,
+                PLAY_BUTTON_IMAGE,
                 self.__title_screen_play_click,
                 self.all_text,
                 center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 250)
             )
-
-            pygame.mixer.music.load(ASSETS_DIR / "music" / "title_screen.ogg")
-            pygame.mixer.music.set_volume(0.20)
-            if not self.muted:
-                pygame.mixer.music.play(loops=-1)
-
         elif self.screen_state == GameState.States.GAME_SCREEN:
-            self.bg_surf = self.room_bg
             self.warrior_text = UpdatableTextArea(
                 self.font, GREEN, lambda: f"[1] Warrior units: {self.playable_units[Warrior]}", self.all_text, topleft=(10, 10)
             )
@@ -192,6 +362,8 @@ class GameState:
             self.mage_text = UpdatableTextArea(
                 self.font, BLACK, lambda: f"[3] Mage units: {self.playable_units[Mage]}", self.all_text, topleft=(10, 50)
             )
+            for unit_text in [self.warrior_text, self.ranger_text, self.mage_text]:
+                bindings.append((PLAYABLE_UNITS_CHANGED, unit_text))
 
             TextArea(
                 self.font,
@@ -206,7 +378,7 @@ class GameState:
                 UpdatableTextArea(
                     self.font,
                     BLACK,
-                    lambda e=entity: f"{e.__name__} health: {e.health}",
+                    lambda e=entity: f"{e.__name__} health: {self.stats[e].health}",
                     self.stats_text,
                     topleft=(10, pos)
                 )
@@ -214,7 +386,7 @@ class GameState:
                 UpdatableTextArea(
                     self.font,
                     BLACK,
-                    lambda e=entity: f"{e.__name__} attack: {e.attack}",
+                    lambda e=entity: f"{e.__name__} attack: {self.stats[e].attack}",
                     self.stats_text,
                     topleft=(10, pos),
                 )
@@ -222,7 +394,7 @@ class GameState:
                 UpdatableTextArea(
                     self.font,
                     BLACK,
-                    lambda e=entity: f"{e.__name__} speed: {e.speed}",
+                    lambda e=entity: f"{e.__name__} speed: {self.stats[e].speed}",
                     self.stats_text,
                     topleft=(10, pos),
                 )
@@ -230,13 +402,14 @@ class GameState:
                 UpdatableTextArea(
                     self.font,
                     BLACK,
-                    lambda e=entity: f"{e.__name__} attack speed: {e.attack_speed(e.attack_speed_scale) / 1000}s",
+                    lambda e=entity: f"{e.__name__} attack speed: {self.stats[e].attack_delay / 1000}s",
                     self.stats_text,
                     topleft=(10, pos),
                 )
                 pos += 20
+            for stat_text in self.stats_text:
+                bindings.append((STAT_CHANGED, stat_text))
 
-            self.rooms_cleared = 0
             rooms_cleared = UpdatableTextArea(
                 self.font,
                 BLACK,
@@ -244,36 +417,61 @@ class GameState:
                 self.all_text,
                 topright=(SCREEN_WIDTH - 10, 10),
             )
+            bindings.append((ROOMS_CLEARED_CHANGED, rooms_cleared))
             self.room_cleared_text = TimedTextArea(
                 self.font, "Room Cleared!", BLACK, 1000, topleft=rooms_cleared.rect.move(0, 25).topleft
             )
-
-            self.generate_room()
-
-            pygame.mixer.music.load(ASSETS_DIR / "music" / "gameplay.ogg")
-            pygame.mixer.music.set_volume(0.20)
-            if not self.muted:
-                pygame.mixer.music.play(loops=-1)
         elif self.screen_state == GameState.States.GAME_OVER:
-            self.bg_surf = self.game_over_bg
-
             Button(
-                (427, 108),
-                ASSETS_DIR / "game_over" / "play_again.png",
+                PLAY_AGAIN_BUTTON_SIZE,
+                PLAY_AGAIN_BUTTON_IMAGE,
                 self.__game_over_play_click,
                 self.all_text,
                 center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 230)
             )
-
-            pygame.mixer.music.load(ASSETS_DIR / "music" / "gameover.ogg")
-            pygame.mixer.music.set_volume(0.30)
-            if not self.muted:
-                pygame.mixer.music.play()
+        return bindings
+
+    def advance(self, screen, delta_time) -> int:
+        # Runs the fixed SIMULATION_STEP ticks covered by one rendered frame's delta_time, at most
+        # MAX_CATCH_UP_TICKS of them. The leftover time carries over to the next frame and sets how far
+        # draw() interpolates between the last two ticks. Returns the number of ticks run.
+        self.accumulator += delta_time
+        ticks = 0
+        while self.accumulator >= SIMULATION_STEP and ticks < MAX_CATCH_UP_TICKS:
+            for entity in self.all_entities:
+                entity.previous_topleft = entity.rect.topleft
+            self.update(screen, SIMULATION_STEP)
+            self.accumulator -= SIMULATION_STEP
+            ticks += 1
+        if self.accumulator >= SIMULATION_STEP:
+            # Too far behind (a stall, or hardware too slow for the simulation): let the backlog go
+            self.skipped_time += self.accumulator - self.accumulator % SIMULATION_STEP
+            self.accumulator %= SIMULATION_STEP
+        self.ticks += ticks
+        self.interpolation = self.accumulator / SIMULATION_STEP
+        return ticks
 
     def update(self, screen, delta_time):
+        # One simulation tick. The game loop calls this through advance() with delta_time = SIMULATION_STEP.
+        self.audio.begin_frame(delta_time)
         if self.screen_state == GameState.States.GAME_SCREEN:
-            self.all_players.update(self, screen.get_rect(), self.all_enemies, delta_time)
-            self.all_enemies.update(self, screen.get_rect(), self.all_players, delta_time)
+            if self.combat_engine is not None:
+                self.profiler.begin("update.combat_engine")
+                self.combat_engine.step(self, screen.get_rect(), delta_time)
+                self.profiler.end()
+            else:
+                self.profiler.begin("update.players")
+                self.enemy_grid.rebuild()
+                if self.enemy_field is not None:
+                    self.enemy_field.update()
+                self.all_players.update(self, screen.get_rect(), self.enemy_grid, delta_time, self.enemy_field)
+                self.profiler.end()
+                self.profiler.begin("update.enemies")
+                self.player_grid.rebuild()
+                if self.player_field is not None:
+                    self.player_field.update()
+                self.all_enemies.update(self, screen.get_rect(), self.player_grid, delta_time, self.player_field)
+                self.profiler.end()
 
             if len(self.all_players) + sum(self.playable_units.values()) <= 0:
                 # Game over
@@ -283,8 +481,8 @@ class GameState:
                     self.rooms_cleared += 1
                     self.room_transition_timer = 0
                     self.room_cleared_text.add(self.all_text)
-                    if self.rooms_cleared % 3 == 0:
-                        pygame.event.post(pygame.event.Event(SHOW_NOTIFICATION, text="Enemies are getting stronger..."))
+                    if self.rooms_cleared % self.enemy_scaling_interval == 0:
+                        self.events.publish(SHOW_NOTIFICATION, text="Enemies are getting stronger...")
                 else:
                     self.room_transition_timer += delta_time
                     if self.room_transition_timer >= 1000:
@@ -292,114 +490,294 @@ class GameState:
                         for entity in self.all_players:
                             self.playable_units[type(entity)] += 1
                             entity.kill()
-                        if self.rooms_cleared % 3 == 0:
+                        if self.rooms_cleared % self.enemy_scaling_interval == 0:
                             for enemy_type in [Skeleton, Zombie]:
-                                random_stat = random.randint(0, 3)
-                                if random_stat == 0:
-                                    enemy_type.health += 1
-                                elif random_stat == 1:
-                                    enemy_type.attack += 1
-                                elif random_stat == 2:
-                                    enemy_type.speed += 1
-                                elif random_stat == 3:
-                                    enemy_type.attack_speed_scale += 1
-                        if self.rooms_cleared % 5 == 0:
-                            new_unit = random.choice([Warrior, Ranger, Mage])
+                                self.stats.upgrade(enemy_type, self.random.randint(0, 3))
+                        if self.rooms_cleared % self.reinforcement_interval == 0:
+                            new_unit = self.random.choice([Warrior, Ranger, Mage])
                             self.playable_units[new_unit] += 1
-                            pygame.event.post(pygame.event.Event(SHOW_NOTIFICATION, text=f"A {new_unit.__name__} has joined your party"))
+                            self.events.publish(SHOW_NOTIFICATION, text=f"A {new_unit.__name__} has joined your party")
+                        self.profiler.begin("update.generate_room")
                         self.generate_room()
+                        self.profiler.end()
 
+        self.profiler.begin("update.text")
         self.all_text.update(self, delta_time)
-        self.stats_text.update(self, delta_time)
-
-    def draw(self, screen):
-        screen.blit(self.bg_surf, self.bg_surf.get_rect())
-        for entity in self.all_entities:
-            entity.draw(screen)
-        self.all_text.draw(screen)
-        if self.show_stats:
-            self.stats_text.draw(screen)
+        self.profiler.end()
+
+    def draw(self, screen) -> list[pygame.Rect]:
+        # Returns the parts of the screen that changed, for pygame.display.update()
+        if self.show_flow_field and self.dirty_renderer is not None:
+            # The overlay covers the whole field, so repaint everything under it every frame
+            self.dirty_renderer.invalidate()
+        if self.dirty_renderer is not None:
+            self.profiler.begin("draw.dirty")
+            texts = list(self.all_text)
+            if self.show_stats:
+                texts += self.stats_text.sprites()
+            rects = self.dirty_renderer.draw(screen, self.bg_surf, self.all_entities, texts, self.interpolation)
+            self.profiler.end()
+        else:
+            frame = screen if self.framebuffer is None else self.framebuffer.surface
+            self.profiler.begin("draw.entities")
+            # One Surface.blits() call for the background, every entity and health bar, in the same order as
+            # drawing them one by one
+            alpha = self.interpolation
+            blits = [(self.bg_surf, (0, 0))]
+            blits += [blit for entity in self.all_entities for blit in entity.blits(interpolated_offset(entity, alpha))]
+            if self.framebuffer is not None:
+                blits = self.framebuffer.scale_blits(blits)
+            frame.blits(blits, doreturn=False)
+            self.profiler.end()
+            self.profiler.begin("draw.text")
+            blits = [(text.image, text.rect) for text in self.all_text]
+            if self.show_stats:
+                blits += [(text.image, text.rect) for text in self.stats_text]
+            if self.framebuffer is not None:
+                blits = self.framebuffer.scale_blits(blits)
+            frame.blits(blits, doreturn=False)
+            self.profiler.end()
+            if self.framebuffer is not None:
+                self.profiler.begin("draw.present")
+                self.framebuffer.present(screen)
+                self.profiler.end()
+            rects = [screen.get_rect()]
+
+        if self.show_flow_field and self.enemy_field is not None:
+            self.enemy_field.draw(screen)
+        if self.show_profiler:
+            rects.append(self.profiler_overlay.draw(screen, self.profiler, self.cache_lines()))
+        return rects
+
+    def entity_counts(self) -> dict[str, int]:
+        return {
+            "players": len(self.all_players),
+            "enemies": len(self.all_enemies),
+            "text": len(self.all_text),
+        }
+
+    def cache_lines(self) -> list[str]:
+        # Hit counts of the shared caches and what the voice manager did with sounds, for the profiler overlay
+        assets = registry.stats()
+        text = text_cache.stats()
+        audio = self.audio.stats()
+        return [
+            f"assets: {assets['hits']} hits  {assets['misses']} misses  {assets['load_time_ms']:.0f} ms",
+            f"text: {text['hits']} hits  {text['misses']} misses  {text['size']} cached",
+            f"audio: {audio['played']} played  {audio['merged']} merged  {audio['dropped']} dropped",
+        ]
+
+    def toggle_profiler(self):
+        self.show_profiler = not self.show_profiler
+        self.profiler.enabled = self.show_profiler or self.profiler.trace_file is not None
+        if not self.show_profiler and self.dirty_renderer is not None:
+            # Nothing else would repaint the area under the panel
+            self.dirty_renderer.invalidate()
+
+    def toggle_flow_field(self):
+        self.show_flow_field = not self.show_flow_field
+        if self.dirty_renderer is not None:
+            self.dirty_renderer.invalidate()
 
     def toggle_mute(self):
         self.muted = not self.muted
         if self.muted:
             pygame.mixer.music.stop()
         else:
-            loops = -1 if self.screen_state != GameState.States.GAME_OVER else 0
-            pygame.mixer.music.play(loops=loops)
+            self.__play_music()
 
     def __title_screen_play_click(self):
         if sum(self.playable_units.values()) == 5:
             self.transition_state(GameState.States.GAME_SCREEN)
             if not self.muted:
-                self.play_button_sound.play()
+                self.audio.play("ui", self.play_button_sound)
 
     def __game_over_play_click(self):
-        for unit in [Warrior, Ranger, Mage, Skeleton, Zombie]:
-            unit.reset_stats()
+        self.stats.reset()
 
         self.selected_unit = Warrior
         self.transition_state(GameState.States.TITLE_SCREEN)
         if not self.muted:
-            self.play_button_sound.play()
-
-
-pygame.init()
-
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Storm the Castle")
-icon = pygame.image.load(ASSETS_DIR / "logo.png")
-pygame.display.set_icon(icon)
-
-game = GameState(GameState.States.TITLE_SCREEN)
-
-clock = pygame.time.Clock()
-
-running = True
-delta_time = 0
-while running:
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            running = False
-        elif event.type == MOUSEBUTTONDOWN:
-            if game.screen_state == GameState.States.GAME_SCREEN and event.button == MOUSE_LEFT_CLICK:
-                game.spawn_playable_unit(event.pos)
-        elif event.type == MOUSEBUTTONUP:
-            if event.button == MOUSE_LEFT_CLICK:
-                clicked_sprites = [
-                    s for s in game.all_text if s.rect.collidepoint(event.pos)
-                ]
-                for sprite in clicked_sprites:
-                    if hasattr(sprite, "handle_click"):
-                        sprite.handle_click(game)
-        elif event.type == KEYDOWN:
-            if event.key == K_m:
-                game.toggle_mute()
-            if game.screen_state == GameState.States.GAME_SCREEN:
-                if event.key == K_1:
-                    game.selected_unit = Warrior
-                    game.warrior_text.set_color(GREEN)
-                    game.ranger_text.set_color(BLACK)
-                    game.mage_text.set_color(BLACK)
-                elif event.key == K_2:
-                    game.selected_unit = Ranger
-                    game.warrior_text.set_color(BLACK)
-                    game.ranger_text.set_color(GREEN)
-                    game.mage_text.set_color(BLACK)
-                elif event.key == K_3:
-                    game.selected_unit = Mage
-                    game.warrior_text.set_color(BLACK)
-                    game.ranger_text.set_color(BLACK)
-                    game.mage_text.set_color(GREEN)
-                elif event.key == K_i:
-                    game.show_stats = not game.show_stats
-        elif event.type == SHOW_NOTIFICATION and game.screen_state == GameState.States.GAME_SCREEN:
-            game.add_notification(event.text)
-
-    game.update(screen, delta_time)
-    game.draw(screen)
-
-    pygame.display.update()
-    delta_time = clock.tick(60)
-
-pygame.quit()
+            self.audio.play("ui", self.play_button_sound)
+
+
+def handle_event(game: GameState, event: pygame.event.Event) -> bool:
+    # Applies one input or game event to the game. Returns False once the game should exit.
+    if event.type == QUIT:
+        return False
+    elif event.type == MOUSEBUTTONDOWN:
+        if game.screen_state == GameState.States.GAME_SCREEN and event.button == MOUSE_LEFT_CLICK:
+            game.spawn_playable_unit(event.pos)
+    elif event.type == MOUSEBUTTONUP:
+        if event.button == MOUSE_LEFT_CLICK:
+            clicked_sprites = [
+                s for s in game.all_text if s.rect.collidepoint(event.pos)
+            ]
+            for sprite in clicked_sprites:
+                if hasattr(sprite, "handle_click"):
+                    sprite.handle_click(game)
+    elif event.type == KEYDOWN:
+        if event.key == K_m:
+            game.toggle_mute()
+        elif event.key == K_F3:
+            game.toggle_profiler()
+        elif event.key == K_F4:
+            game.toggle_flow_field()
+        if game.screen_state == GameState.States.GAME_SCREEN:
+            if event.key == K_1:
+                game.select_unit(Warrior)
+            elif event.key == K_2:
+                game.select_unit(Ranger)
+            elif event.key == K_3:
+                game.select_unit(Mage)
+            elif event.key == K_i:
+                game.show_stats = not game.show_stats
+    return True
+
+
+def screen_image_variants() -> list[tuple]:
+    # The scaled images of the screens' widgets, like sprites.image_variants()
+    return [
+        (PLAY_BUTTON_IMAGE, PLAY_BUTTON_SIZE, False, True),
+        (PLAY_AGAIN_BUTTON_IMAGE, PLAY_AGAIN_BUTTON_SIZE, False, True),
+    ]
+
+
+def load_screen_assets():
+    # What GameState loads itself
+    registry.font("font/morris-roman.black.ttf", 24)
+    registry.font("font/morris-roman.black.ttf", 16)
+    registry.image("title_screen/title.png", alpha=False)
+    registry.image("background.png", alpha=False)
+    registry.image("game_over/background.png", alpha=False)
+    for path, size, flip_x, alpha in screen_image_variants():
+        registry.image(path, size, flip_x, alpha)
+    registry.sound("sounds/button/play_again.ogg", 0.5)
+    for track, _, _ in GameState.MUSIC.values():
+        registry.music(track)
+
+
+def show_loading_screen(screen: pygame.Surface, font: pygame.font.Font, loader: BackgroundLoader, fps: int) -> bool:
+    # Draws a progress bar until the loader is done. Returns False if the window was closed first.
+    clock = pygame.time.Clock()
+    text = font.render("Loading...", True, (230, 230, 230))
+    text_rect = text.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 20))
+    bar = pygame.Rect(0, 0, SCREEN_WIDTH // 2, 20)
+    bar.center = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 20)
+    while not loader.done():
+        # Input before the title screen exists has nothing to act on
+        if any(event.type == QUIT for event in pygame.event.get()):
+            loader.cancel()
+            return False
+        screen.fill(BLACK)
+        screen.blit(text, text_rect)
+        pygame.draw.rect(screen, (90, 90, 90), bar, 2)
+        filled = bar.inflate(-6, -6)
+        filled.w = round(filled.w * loader.progress())
+        pygame.draw.rect(screen, GREEN, filled)
+        pygame.display.flip()
+        clock.tick(fps)
+    loader.wait()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storm the Castle")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the game's random rolls (default: random)")
+    parser.add_argument("--record", help="save the seed and every input to this file, for src/replay.py")
+    parser.add_argument("--profile", action="store_true", help="start with the profiler overlay shown (toggle with F3)")
+    parser.add_argument("--trace", help="write a Chrome trace of the last --trace-frames frames to this file on exit")
+    parser.add_argument("--trace-frames", type=int, default=600, help="frames kept for --trace (default: 600)")
+    parser.add_argument(
+        "--render-scale",
+        type=float,
+        default=RENDER_SCALE,
+        help=f"draw at this fraction of the window's resolution, e.g. 0.5 on slow hardware (default: {RENDER_SCALE})",
+    )
+    parser.add_argument("--fps", type=int, default=RENDER_FPS, help=f"frame rate cap, doesn't change the game speed (default: {RENDER_FPS})")
+    parser.add_argument(
+        "--asset-bundle",
+        action="store_true",
+        help=f"load the assets from {ASSETS_BUNDLE} (made by src/bundle.py) instead of the loose files, as frozen builds do",
+    )
+    args = parser.parse_args()
+    if args.asset_bundle and registry.bundle is None:
+        registry.bundle = AssetBundle(ASSETS_BUNDLE)
+
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+
+    pygame.init()
+
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Storm the Castle")
+    icon = pygame.image.load(registry.open("logo.png"), "logo.png")
+    pygame.display.set_icon(icon)
+
+    # Only the loading screen's font is loaded up front, before the loader starts; the images and sounds of
+    # the sprites and screens load on a worker thread meanwhile, so the game starts with every sound list
+    # filled. The registry isn't locked, so nothing else may use it until the loader is done.
+    font = registry.font("font/morris-roman.black.ttf", 24)
+    loader = BackgroundLoader(asset_loaders() + [load_screen_assets])
+    if not show_loading_screen(screen, font, loader, args.fps):
+        pygame.quit()
+        return
+    game = GameState(
+        GameState.States.TITLE_SCREEN,
+        use_combat_engine=COMBAT_ENGINE,
+        dirty_rendering=DIRTY_RECT_RENDERING,
+        use_flow_field=FLOW_FIELD_NAVIGATION,
+        seed=seed,
+        render_scale=args.render_scale,
+    )
+    recorder = (
+        Recorder(args.record, seed, use_combat_engine=COMBAT_ENGINE, use_flow_field=FLOW_FIELD_NAVIGATION)
+        if args.record
+        else None
+    )
+    profiler = game.profiler
+    if args.trace:
+        profiler.frames = deque(maxlen=args.trace_frames)
+        profiler.trace_file = args.trace
+        profiler.enabled = True
+    if args.profile:
+        game.toggle_profiler()
+
+    clock = pygame.time.Clock()
+
+    running = True
+    delta_time = 0
+    while running:
+        profiler.begin_frame()
+        profiler.begin("events")
+        # Recorded as the game saw them, in logical coordinates
+        events = [ScaledFramebuffer.to_logical(event, screen.get_size()) for event in pygame.event.get()]
+        for event in events:
+            if not handle_event(game, event):
+                running = False
+        profiler.end()
+
+        profiler.begin("update")
+        game.advance(screen, delta_time)
+        profiler.end()
+        if recorder is not None:
+            recorder.write_frame(delta_time, events)
+        profiler.begin("draw")
+        rects = game.draw(screen)
+        profiler.end()
+        profiler.begin("display.update")
+        pygame.display.update(rects)
+        profiler.end()
+        profiler.begin("wait")
+        delta_time = clock.tick(args.fps)
+        profiler.end()
+        profiler.end_frame(game.entity_counts())
+
+    if recorder is not None:
+        recorder.close()
+    if profiler.trace_file is not None:
+        profiler.write_chrome_trace(profiler.trace_file)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
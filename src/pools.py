@@ -0,0 +1,135 @@
+import threading
+
+from pygame.sprite import Sprite
+
+# Most dead sprites kept for reuse per class; past this they're left to the garbage collector
+POOL_MAX_SIZE = 512
+
+
+class SpritePool:
+    # Free list of dead sprites of one class. acquire() reinitializes a free sprite in place with
+    # reset() when there is one and only constructs a new sprite when the pool is empty.
+    # Pools are shared by every game in the process, so the free list and counters are behind a lock for
+    # games stepped on different threads; the sprite itself is set up outside it.
+    def __init__(self, sprite_type: type, max_size: int = POOL_MAX_SIZE):
+        self.sprite_type = sprite_type
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.free: list[Sprite] = []
+        self.created = 0
+        self.reused = 0
+        self.live = 0
+        self.peak_live = 0
+
+    def acquire(self, *args, **kwargs) -> Sprite:
+        with self.lock:
+            sprite = self.free.pop() if self.free else None
+            if sprite is None:
+                self.created += 1
+            else:
+                self.reused += 1
+            self.live += 1
+            self.peak_live = max(self.peak_live, self.live)
+        if sprite is None:
+            sprite = self.sprite_type(*args, **kwargs)
+        else:
+            sprite.reset(*args, **kwargs)
+        # After the constructor or reset(), which clear it
+        sprite.pool = self
+        return sprite
+
+    def release(self, sprite: Sprite):
+        with self.lock:
+            self.live -= 1
+            if len(self.free) < self.max_size:
+                self.free.append(sprite)
+
+    def stats(self) -> dict:
+        acquired = self.created + self.reused
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "reuse_rate": round(self.reused / acquired, 3) if acquired else None,
+            "free": len(self.free),
+            "live": self.live,
+            "peak_live": self.peak_live,
+        }
+
+
+pools: dict[type, SpritePool] = {}
+
+
+class PooledSprite(Sprite):
+    # Sprite that can be handed out by a SpritePool: create it with Class.spawn(...) instead of Class(...).
+    # It goes back to its pool as soon as it leaves its last group, through kill(), Group.remove() or
+    # Group.empty(), so nothing may keep using it after that. Sprites built with the constructor aren't
+    # pooled. Subclasses can override reset() to skip setup that doesn't change between uses.
+    # The groups a pooled sprite is in are kept in a tuple in place of the set every pygame Sprite makes,
+    # which is the biggest part of a small sprite; the groups themselves work as usual. The pool a sprite came
+    # from is a slot too, so pooling one doesn't give it an instance dict.
+    __slots__ = ("sprite_groups", "pool")
+
+    def __init__(self, *groups):
+        # Sprite.__init__ isn't called so the set is never made
+        self.sprite_groups = ()
+        self.pool: SpritePool | None = None
+        if groups:
+            self.add(*groups)
+
+    @classmethod
+    def spawn(cls, *args, **kwargs):
+        pool = pools.get(cls)
+        if pool is None:
+            # setdefault so two threads spawning the first sprite of a class end up with the same pool
+            pool = pools.setdefault(cls, SpritePool(cls))
+        return pool.acquire(*args, **kwargs)
+
+    def reset(self, *args, **kwargs):
+        self.__init__(*args, **kwargs)
+
+    def add(self, *groups):
+        for group in groups:
+            if hasattr(group, "_spritegroup"):
+                if group not in self.sprite_groups:
+                    group.add_internal(self)
+                    self.add_internal(group)
+            else:
+                self.add(*group)
+
+    def remove(self, *groups):
+        for group in groups:
+            if hasattr(group, "_spritegroup"):
+                if group in self.sprite_groups:
+                    group.remove_internal(self)
+                    self.remove_internal(group)
+            else:
+                self.remove(*group)
+
+    def add_internal(self, group):
+        self.sprite_groups += (group,)
+
+    def remove_internal(self, group):
+        self.sprite_groups = tuple(g for g in self.sprite_groups if g is not group)
+        if self.pool is not None and not self.sprite_groups:
+            self.pool.release(self)
+
+    def kill(self):
+        groups = self.sprite_groups
+        for group in groups:
+            group.remove_internal(self)
+        self.sprite_groups = ()
+        if groups and self.pool is not None:
+            self.pool.release(self)
+
+    def groups(self) -> list:
+        return list(self.sprite_groups)
+
+    def alive(self) -> bool:
+        return bool(self.sprite_groups)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} Sprite(in {len(self.sprite_groups)} groups)>"
+
+
+def pool_stats() -> dict[str, dict]:
+    return {sprite_type.__name__: pool.stats() for sprite_type, pool in pools.items()}
@@ -0,0 +1,138 @@
+import json
+import time
+from collections import deque
+
+import pygame
+from pygame import Rect, Surface
+from pygame.font import Font
+
+# Frames averaged for the numbers shown on the overlay, and frames drawn in its frame-time graph
+OVERLAY_AVERAGE_FRAMES = 30
+OVERLAY_GRAPH_FRAMES = 126
+# Frame time at the top of the graph, in ms
+OVERLAY_GRAPH_MAX_MS = 50
+OVERLAY_LINE_HEIGHT = 16
+OVERLAY_GRAPH_HEIGHT = 40
+OVERLAY_WIDTH = OVERLAY_GRAPH_FRAMES * 2 + 8
+
+
+class FrameProfiler:
+    # Times the phases of each frame while enabled and keeps the last `capacity` frames in a ring buffer.
+    # Phases nest and may repeat within a frame:
+    #   profiler.begin_frame(); profiler.begin("draw"); profiler.begin("draw.entities"); profiler.end(); profiler.end()
+    #   profiler.end_frame({"players": 3})
+    # While disabled every call returns straight away, so the hooks stay in the game loop.
+    def __init__(self, capacity: int = 600):
+        self.enabled = False
+        # Where to write a Chrome trace of the buffered frames when the game exits, if anywhere
+        self.trace_file = None
+        self.frames: deque[tuple] = deque(maxlen=capacity)
+        self.__frame_start = None
+        self.__phases = []
+        self.__open = []
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.__frame_start = time.perf_counter_ns()
+        self.__phases = []
+        self.__open = []
+
+    def begin(self, name: str):
+        if not self.enabled or self.__frame_start is None:
+            return
+        self.__open.append((name, time.perf_counter_ns()))
+
+    def end(self):
+        if not self.enabled or not self.__open:
+            return
+        name, start = self.__open.pop()
+        self.__phases.append((name, start, time.perf_counter_ns(), len(self.__open)))
+
+    def end_frame(self, counts: dict[str, int]):
+        if not self.enabled or self.__frame_start is None:
+            return
+        self.frames.append((self.__frame_start, time.perf_counter_ns(), self.__phases, counts))
+        self.__frame_start = None
+
+    def summary(self, frames: int = OVERLAY_AVERAGE_FRAMES) -> dict:
+        # Average frame time and per-phase milliseconds over the last few frames
+        recent = list(self.frames)[-frames:]
+        if not recent:
+            return {"fps": 0, "frame_ms": 0, "phases": [], "counts": {}}
+        frame_ms = sum(end - start for start, end, _, _ in recent) / len(recent) / 1e6
+        totals = {}
+        depths = {}
+        for _, _, phases, _ in recent:
+            for name, start, end, depth in sorted(phases, key=lambda phase: phase[1]):
+                totals[name] = totals.get(name, 0) + end - start
+                depths.setdefault(name, depth)
+        return {
+            "fps": 1000 / frame_ms if frame_ms else 0,
+            "frame_ms": frame_ms,
+            "phases": [(name, depths[name], total / len(recent) / 1e6) for name, total in totals.items()],
+            "counts": recent[-1][3],
+        }
+
+    def frame_times(self, frames: int = OVERLAY_GRAPH_FRAMES) -> list[float]:
+        return [(end - start) / 1e6 for start, end, _, _ in list(self.frames)[-frames:]]
+
+    def chrome_trace(self) -> dict:
+        # Trace Event Format, for chrome://tracing or https://ui.perfetto.dev
+        events = []
+        origin = self.frames[0][0] if self.frames else 0
+        for start, end, phases, counts in self.frames:
+            events.append({"name": "frame", "ph": "X", "ts": (start - origin) / 1000, "dur": (end - start) / 1000, "pid": 1, "tid": 1})
+            for name, phase_start, phase_end, _ in phases:
+                events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (phase_start - origin) / 1000,
+                    "dur": (phase_end - phase_start) / 1000,
+                    "pid": 1,
+                    "tid": 1,
+                })
+            events.append({"name": "entities", "ph": "C", "ts": (start - origin) / 1000, "pid": 1, "args": counts})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class ProfilerOverlay:
+    # Opaque panel in the bottom right corner with FPS, a frame-time graph, per-phase milliseconds and
+    # entity counts. It only ever grows, so it always covers whatever it drew in earlier frames and can
+    # be drawn over a dirty-rect frame.
+    def __init__(self, font: Font, screen_rect: Rect):
+        self.font = font
+        self.screen_rect = screen_rect
+        self.height = 0
+
+    def draw(self, screen: Surface, profiler: FrameProfiler, extra_lines: list[str] = ()) -> Rect:
+        # extra_lines go under the entity counts, e.g. cache hit counts
+        summary = profiler.summary()
+        lines = [f"{summary['fps']:.0f} FPS  {summary['frame_ms']:.2f} ms"]
+        lines += [f"{'  ' * depth}{name}: {ms:.2f} ms" for name, depth, ms in summary["phases"]]
+        lines.append("  ".join(f"{name}: {count}" for name, count in summary["counts"].items()))
+        lines += extra_lines
+
+        self.height = max(self.height, OVERLAY_GRAPH_HEIGHT + len(lines) * OVERLAY_LINE_HEIGHT + 12)
+        rect = Rect(0, 0, OVERLAY_WIDTH, self.height)
+        rect.bottomright = self.screen_rect.move(-10, -30).bottomright
+        screen.fill((20, 20, 20), rect)
+
+        graph_bottom = rect.top + 4 + OVERLAY_GRAPH_HEIGHT
+        budget_y = graph_bottom - OVERLAY_GRAPH_HEIGHT * (1000 / 60) / OVERLAY_GRAPH_MAX_MS
+        pygame.draw.line(screen, (90, 90, 90), (rect.left + 4, budget_y), (rect.right - 5, budget_y))
+        for i, ms in enumerate(profiler.frame_times()):
+            x = rect.left + 4 + i * 2
+            bar = min(ms / OVERLAY_GRAPH_MAX_MS, 1) * OVERLAY_GRAPH_HEIGHT
+            color = (0, 200, 0) if ms <= 1000 / 60 else (220, 60, 60)
+            pygame.draw.line(screen, color, (x, graph_bottom), (x, graph_bottom - bar))
+
+        y = graph_bottom + 4
+        for line in lines:
+            screen.blit(self.font.render(line, True, (230, 230, 230)), (rect.left + 6, y))
+            y += OVERLAY_LINE_HEIGHT
+        return rect
@@ -0,0 +1,165 @@
+import weakref
+
+import pygame
+from pygame import Rect, Surface
+from pygame.event import Event
+from pygame.sprite import Sprite
+
+from assets import registry
+from consts import *
+from sprites import interpolated_offset
+
+# Past this many dirty regions (or this share of the screen) a full redraw is cheaper
+MAX_DIRTY_RECTS = 48
+MAX_DIRTY_AREA = 0.5
+
+
+class DirtyRenderer:
+    # Redraws only the parts of the screen that changed since the last frame.
+    # Every entity (sprite plus health bar) and text sprite is remembered with its on-screen bounds and
+    # what it looked like. A sprite that moved, changed image or health, appeared or disappeared marks
+    # its old and new bounds dirty; each dirty region is repainted from the background and everything
+    # overlapping it is drawn again in the usual order, clipped to the region.
+    # Entities are drawn shifted by interpolated_offset(), see GameState.advance(). Each full redraw or dirty
+    # region is drawn with a single Surface.blits() call.
+    # draw() returns the rects that need to be passed to pygame.display.update().
+    def __init__(self):
+        self.last: dict[Sprite, tuple] = {}
+        self.background: Surface | None = None
+
+    def invalidate(self):
+        self.background = None
+
+    @staticmethod
+    def __entity_state(entity, offset: tuple[int, int]) -> tuple:
+        bounds = entity.rect.union(entity.health_bar_rect).move(offset)
+        return bounds, (tuple(bounds), entity.image, entity.health / entity.max_health)
+
+    @staticmethod
+    def __text_state(text) -> tuple:
+        return text.rect, (tuple(text.rect), text.image)
+
+    def draw(self, screen: Surface, background: Surface, entities, texts, interpolation: float = 1.0) -> list[Rect]:
+        drawables = []
+        current = {}
+        for entity in entities:
+            offset = interpolated_offset(entity, interpolation)
+            bounds, state = self.__entity_state(entity, offset)
+            drawables.append((bounds, entity.blits(offset)))
+            current[entity] = (bounds, state)
+        for text in texts:
+            bounds, state = self.__text_state(text)
+            drawables.append((bounds, [(text.image, text.rect)]))
+            current[text] = (bounds, state)
+
+        dirty = None
+        if background is self.background:
+            dirty = []
+            for sprite, (bounds, state) in current.items():
+                old = self.last.get(sprite)
+                if old is None:
+                    dirty.append(bounds)
+                elif old[1] != state:
+                    dirty.append(old[0])
+                    dirty.append(bounds)
+            for sprite, (bounds, _) in self.last.items():
+                if sprite not in current:
+                    dirty.append(bounds)
+
+            screen_rect = screen.get_rect()
+            dirty = [r.clip(screen_rect) for r in dirty]
+            dirty = [r for r in dirty if r.w and r.h]
+            area = sum(r.w * r.h for r in dirty)
+            if len(dirty) > MAX_DIRTY_RECTS or area > MAX_DIRTY_AREA * screen_rect.w * screen_rect.h:
+                dirty = None
+
+        self.last = current
+        self.background = background
+
+        if dirty is None:
+            screen.blit(background, (0, 0))
+            screen.blits([blit for _, blits in drawables for blit in blits], doreturn=False)
+            return [screen.get_rect()]
+
+        all_bounds = [bounds for bounds, _ in drawables]
+        for region in dirty:
+            screen.set_clip(region)
+            screen.blit(background, region, region)
+            screen.blits([blit for i in region.collidelistall(all_bounds) for blit in drawables[i][1]], doreturn=False)
+        screen.set_clip(None)
+        return dirty
+
+
+class ScaledFramebuffer:
+    # Offscreen frame at `scale` times the logical screen size (SCREEN_WIDTH x SCREEN_HEIGHT), for hardware
+    # that can't blend a full-size frame in time. Drawing still happens in logical coordinates:
+    # scale_blits() swaps every surface for a copy at the frame's scale and scales its position, and
+    # present() stretches the finished frame over the window in a single call.
+    # Scaled copies are made through registry.resized(). Those of the images already in the registry, i.e. every
+    # preloaded one, are made up front so that no frame has to decode and scale art, and kept for good like the
+    # images themselves. Those of other surfaces, e.g. rendered text, are made on first use and dropped along
+    # with the original.
+    # Examples: frame.surface.blits(frame.scale_blits([(image, rect), (bar, bar_rect, area)]))
+    #           frame.present(screen)
+    def __init__(self, scale: float):
+        self.scale = scale
+        self.surface = Surface((round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale)))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        # A plain dict for registry images, which is quicker to look up than the weak one
+        self.images: dict[Surface, Surface] = {}
+        self.variants: weakref.WeakKeyDictionary[Surface, Surface] = weakref.WeakKeyDictionary()
+        self.areas: dict[tuple, Rect] = {}
+        for key, surf in list(registry.surfaces.items()):
+            if key not in registry.resized_keys:
+                self.variant(surf)
+
+    def variant(self, surf: Surface) -> Surface:
+        scaled = self.images.get(surf) or self.variants.get(surf)
+        if scaled is None:
+            width, height = surf.get_size()
+            size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+            scaled = registry.resized(surf, size)
+            if surf in registry.surface_keys:
+                self.images[surf] = scaled
+            else:
+                self.variants[surf] = scaled
+        return scaled
+
+    def scale_blits(self, blits: list[tuple]) -> list[tuple]:
+        # Surface.blits() arguments in logical coordinates -> the same for self.surface
+        scale = self.scale
+        images = self.images
+        variant = self.variant
+        scaled = []
+        append = scaled.append
+        for blit in blits:
+            surf = images.get(blit[0]) or variant(blit[0])
+            x, y = blit[1][:2]
+            if len(blit) == 2:
+                append((surf, (round(x * scale), round(y * scale))))
+            else:
+                append((surf, (round(x * scale), round(y * scale)), self.__area(blit[2])))
+        return scaled
+
+    def __area(self, area: Rect) -> Rect:
+        key = tuple(area)
+        scaled = self.areas.get(key)
+        if scaled is None:
+            x, y, w, h = key
+            scale = self.scale
+            scaled = self.areas[key] = Rect(round(x * scale), round(y * scale), round(w * scale), round(h * scale))
+        return scaled
+
+    def present(self, window: Surface):
+        pygame.transform.scale(self.surface, window.get_size(), window)
+
+    @staticmethod
+    def to_logical(event: Event, window_size: tuple[int, int]) -> Event:
+        # Mouse positions arrive in window pixels; the game works in logical coordinates. The two are the same
+        # while the window has the logical size, which is how main() opens it.
+        if not hasattr(event, "pos") or window_size == (SCREEN_WIDTH, SCREEN_HEIGHT):
+            return event
+        x, y = event.pos
+        pos = (x * SCREEN_WIDTH // window_size[0], y * SCREEN_HEIGHT // window_size[1])
+        return Event(event.type, event.dict | {"pos": pos})
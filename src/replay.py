@@ -0,0 +1,159 @@
+import argparse
+import gzip
+import json
+import struct
+import time
+import zlib
+from pathlib import Path
+
+import pygame
+from pygame.locals import QUIT, KEYDOWN, MOUSEBUTTONDOWN, MOUSEBUTTONUP
+
+# File layout (gzip compressed): MAGIC, HEADER, then one FRAME per frame followed by its events.
+# Only player input is stored. Everything else, including the notifications the game shows, is recreated
+# by replaying the same inputs on top of the same seed.
+MAGIC = b"STCREC03"
+HEADER = struct.Struct("<8sQ??")  # magic, seed, combat engine on, flow field navigation on
+FRAME = struct.Struct("<IH")  # delta_time in ms, number of events
+MOUSE_EVENT = struct.Struct("<BBhh")  # kind, button, x, y
+KEY_EVENT = struct.Struct("<BI")  # kind, key
+QUIT_EVENT = struct.Struct("<B")  # kind
+
+MOUSE_KINDS = {MOUSEBUTTONDOWN: 1, MOUSEBUTTONUP: 2}
+KEY_KIND = 3
+QUIT_KIND = 4
+KIND_TYPES = {kind: event_type for event_type, kind in MOUSE_KINDS.items()}
+
+
+class Recorder:
+    # Writes the seed and, for every frame, its delta_time and the input events handled in it.
+    # Usage: game = GameState(..., seed=seed); recorder = Recorder(path, seed); ...; recorder.write_frame(delta_time, events)
+    def __init__(self, path: str | Path, seed: int, use_combat_engine: bool = False, use_flow_field: bool = False):
+        self.file = gzip.open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, seed, use_combat_engine, use_flow_field))
+        self.frames = 0
+
+    def write_frame(self, delta_time: int, events: list[pygame.event.Event]):
+        encoded = []
+        for event in events:
+            if event.type in MOUSE_KINDS:
+                encoded.append(MOUSE_EVENT.pack(MOUSE_KINDS[event.type], event.button, *event.pos))
+            elif event.type == KEYDOWN:
+                encoded.append(KEY_EVENT.pack(KEY_KIND, event.key))
+            elif event.type == QUIT:
+                encoded.append(QUIT_EVENT.pack(QUIT_KIND))
+        self.file.write(FRAME.pack(delta_time, len(encoded)))
+        self.file.write(b"".join(encoded))
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+
+def load_recording(path: str | Path) -> tuple[int, dict, list[tuple[int, list[pygame.event.Event]]]]:
+    # Returns (seed, GameState options, [(delta_time, events), ...])
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+    magic, seed, use_combat_engine, use_flow_field = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a recording")
+
+    frames = []
+    offset = HEADER.size
+    while offset < len(data):
+        delta_time, count = FRAME.unpack_from(data, offset)
+        offset += FRAME.size
+        events = []
+        for _ in range(count):
+            kind = data[offset]
+            if kind in KIND_TYPES:
+                _, button, x, y = MOUSE_EVENT.unpack_from(data, offset)
+                events.append(pygame.event.Event(KIND_TYPES[kind], button=button, pos=(x, y)))
+                offset += MOUSE_EVENT.size
+            elif kind == KEY_KIND:
+                _, key = KEY_EVENT.unpack_from(data, offset)
+                events.append(pygame.event.Event(KEYDOWN, key=key))
+                offset += KEY_EVENT.size
+            elif kind == QUIT_KIND:
+                events.append(pygame.event.Event(QUIT))
+                offset += QUIT_EVENT.size
+            else:
+                raise ValueError(f"{path}: unknown event kind {kind} at byte {offset}")
+        frames.append((delta_time, events))
+    return seed, {"use_combat_engine": use_combat_engine, "use_flow_field": use_flow_field}, frames
+
+
+def checksum(game) -> int:
+    # Cheap fingerprint of the game state, for checking that two runs of a recording agree
+    state = [game.screen_state.name, game.rooms_cleared, sorted((t.__name__, n) for t, n in game.playable_units.items())]
+    for entity in game.all_entities:
+        state.append((type(entity).__name__, tuple(entity.rect), entity.health))
+    return zlib.crc32(repr(state).encode())
+
+
+def replay(screen: pygame.Surface, path: str | Path, render: bool = False) -> dict:
+    # Feeds a recording back into a fresh GameState frame by frame, through the same fixed-timestep loop
+    # as the game. With render off nothing is drawn and nothing waits on a clock, so the replay runs as
+    # fast as the game logic allows.
+    from main import GameState, handle_event
+
+    seed, options, frames = load_recording(path)
+    game = GameState(GameState.States.TITLE_SCREEN, seed=seed, **options)
+
+    start = time.perf_counter()
+    for delta_time, events in frames:
+        for event in events:
+            handle_event(game, event)
+        game.advance(screen, delta_time)
+        if render:
+            pygame.event.pump()
+            pygame.display.update(game.draw(screen))
+    elapsed = time.perf_counter() - start
+
+    simulated = sum(delta_time for delta_time, _ in frames) / 1000
+    return {
+        "seed": seed,
+        "frames": len(frames),
+        "ticks": game.ticks,
+        "simulated_seconds": simulated,
+        "elapsed_seconds": round(elapsed, 3),
+        "speedup": round(simulated / elapsed, 1) if elapsed else None,
+        "screen": game.screen_state.name,
+        "rooms_cleared": game.rooms_cleared,
+        "checksum": checksum(game),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded game, as fast as possible unless --render is given.")
+    parser.add_argument("recording", help="file written by main.py --record")
+    parser.add_argument("--render", action="store_true", help="draw every frame to a window")
+    parser.add_argument("--profile", help="write cProfile stats of the replay to this file")
+    args = parser.parse_args()
+
+    if args.render:
+        from consts import SCREEN_WIDTH, SCREEN_HEIGHT
+        from sprites import preload_assets
+
+        pygame.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        preload_assets()
+    else:
+        import headless  # Sets up the dummy video and audio drivers before pygame starts
+
+        screen = headless.init_headless()
+
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        result = profiler.runcall(replay, screen, args.recording, args.render)
+        profiler.dump_stats(args.profile)
+    else:
+        result = replay(screen, args.recording, args.render)
+    print(json.dumps(result, indent=2))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
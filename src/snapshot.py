@@ -0,0 +1,293 @@
+import argparse
+import json
+import struct
+import time
+from array import array
+
+import pygame
+
+from consts import *
+from main import GameState
+from sprites import Warrior, Ranger, Mage, Skeleton, Zombie, Chest, Unit, TimedTextArea
+
+# Layout: MAGIC and HEADER, GAME, STATS, RANDOM followed by the generator's 625 words, then one record
+# per entity in all_entities order (UNIT or CHEST, told apart by their first byte) and one TEXT record
+# per timed text on screen in all_text order, each followed by its UTF-8 text.
+# Widgets, images and sounds aren't stored: they are the same for every game and are rebuilt from the
+# screen state.
+MAGIC = b"STCSNP01"
+HEADER = struct.Struct("<8s??")  # magic, combat engine on, flow field navigation on
+# screen state, selected unit, muted, stats shown, Warriors, Rangers and Mages left, rooms cleared,
+# lower bound, upper bound, room transition running, room transition timer, accumulator, interpolation,
+# ticks, skipped time, enemy scaling, room growth and reinforcement intervals, entities, texts
+GAME = struct.Struct("<BB??3HIII?dddQd3III")
+STATS = struct.Struct(f"<{5 * len(NUMBER_TO_STAT_ATTRIBUTE)}i")  # stats of each class in StatTable order
+RANDOM = struct.Struct("<B?d")  # version, has a pending gauss value, the value
+RANDOM_WORDS = 625
+# class, x, y, previous x, previous y, health, attack timer, animation timer, sound timer, frame, walking
+UNIT = struct.Struct("<BiiiiidddB?")
+# class, x, y, previous x, previous y, health, class and stat upgraded when opened
+CHEST = struct.Struct("<BiiiiiBB")
+TEXT = struct.Struct("<BiiddH")  # kind, center x, center y, timer, timeout, UTF-8 length
+
+ENTITY_TYPES = [Warrior, Ranger, Mage, Skeleton, Zombie, Chest]
+CHEST_ID = ENTITY_TYPES.index(Chest)
+PLAYABLE_TYPES = [Warrior, Ranger, Mage]
+ROOM_CLEARED_TEXT = 0
+NOTIFICATION_TEXT = 1
+
+
+def snapshot(game: GameState) -> bytes:
+    # Everything needed to carry on the game from this tick, see restore()
+    if game.combat_engine is not None:
+        # The engine keeps the unit timers in its arrays
+        game.combat_engine.flush()
+
+    texts = []
+    for text in game.all_text:
+        if text in game.all_notifications:
+            encoded = text.text.encode()
+            texts.append(TEXT.pack(NOTIFICATION_TEXT, *text.rect.center, text.timer, text.timeout, len(encoded)) + encoded)
+        elif isinstance(text, TimedTextArea):
+            texts.append(TEXT.pack(ROOM_CLEARED_TEXT, *text.rect.center, text.timer, text.timeout, 0))
+
+    timer = game.room_transition_timer
+    parts = [
+        HEADER.pack(MAGIC, game.combat_engine is not None, game.enemy_field is not None),
+        GAME.pack(
+            game.screen_state.value,
+            PLAYABLE_TYPES.index(game.selected_unit),
+            game.muted,
+            game.show_stats,
+            *[game.playable_units[unit_type] for unit_type in PLAYABLE_TYPES],
+            game.rooms_cleared,
+            game.lower_bound,
+            game.upper_bound,
+            timer is not None,
+            timer or 0,
+            game.accumulator,
+            game.interpolation,
+            game.ticks,
+            game.skipped_time,
+            game.enemy_scaling_interval,
+            game.room_growth_interval,
+            game.reinforcement_interval,
+            len(game.all_entities),
+            len(texts),
+        ),
+        STATS.pack(*[getattr(stats, stat) for stats in game.stats for stat in NUMBER_TO_STAT_ATTRIBUTE]),
+    ]
+    version, words, gauss = game.random.getstate()
+    parts.append(RANDOM.pack(version, gauss is not None, gauss or 0))
+    parts.append(array("I", words).tobytes())
+
+    for entity in game.all_entities:
+        x, y = entity.rect.topleft
+        previous_x, previous_y = entity.previous_topleft
+        if type(entity) is Chest:
+            parts.append(CHEST.pack(
+                CHEST_ID, x, y, previous_x, previous_y, entity.health,
+                PLAYABLE_TYPES.index(entity.random_class), entity.random_stat,
+            ))
+        else:
+            parts.append(UNIT.pack(
+                ENTITY_TYPES.index(type(entity)), x, y, previous_x, previous_y, entity.health,
+                entity.time_since_last_attack, entity.animation_timer, entity.sound_timer,
+                entity.frames().index(entity.image), entity.walking,
+            ))
+    parts += texts
+    return b"".join(parts)
+
+
+def restore(game: GameState, data: bytes):
+    # Puts game back into the state snapshot() saw, in place: the current screen's widgets are kept and
+    # dead sprites come from the pools, so this is quick enough to branch a simulation many times from one
+    # tick. Whether the game uses the combat engine or flow fields stays as it is. Going on from a restored
+    # game plays out exactly like going on from the original.
+    magic, _, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a game snapshot")
+    offset = HEADER.size
+    (
+        screen_state, selected_unit, muted, show_stats, warriors, rangers, mages, rooms_cleared,
+        lower_bound, upper_bound, in_transition, timer, accumulator, interpolation, ticks, skipped_time,
+        enemy_scaling_interval, room_growth_interval, reinforcement_interval, entity_count, text_count,
+    ) = GAME.unpack_from(data, offset)
+    offset += GAME.size
+    stat_values = STATS.unpack_from(data, offset)
+    offset += STATS.size
+    version, has_gauss, gauss = RANDOM.unpack_from(data, offset)
+    offset += RANDOM.size
+    words = array("I")
+    words.frombytes(data[offset:offset + RANDOM_WORDS * words.itemsize])
+    offset += RANDOM_WORDS * words.itemsize
+
+    game.muted = muted
+    state = GameState.States(screen_state)
+    if game.screen_state != state:
+        # Builds the screen's widgets. The room it generates is replaced below, and the random numbers it
+        # used are overwritten last.
+        game.transition_state(state)
+    if game.combat_engine is not None:
+        game.combat_engine.invalidate()
+    game.all_players.empty()
+    game.all_enemies.empty()
+    game.all_entities.empty()
+
+    game.show_stats = show_stats
+    game.playable_units = dict(zip(PLAYABLE_TYPES, (warriors, rangers, mages)))
+    game.rooms_cleared = rooms_cleared
+    game.lower_bound = lower_bound
+    game.upper_bound = upper_bound
+    game.room_transition_timer = timer if in_transition else None
+    game.accumulator = accumulator
+    game.interpolation = interpolation
+    game.ticks = ticks
+    game.skipped_time = skipped_time
+    game.enemy_scaling_interval = enemy_scaling_interval
+    game.room_growth_interval = room_growth_interval
+    game.reinforcement_interval = reinforcement_interval
+    values = iter(stat_values)
+    for stats in game.stats:
+        for stat in NUMBER_TO_STAT_ATTRIBUTE:
+            game.stats.set(stats.unit_type, stat, next(values))
+
+    for _ in range(entity_count):
+        entity_id = data[offset]
+        entity_type = ENTITY_TYPES[entity_id]
+        side = game.all_enemies if entity_type is Chest or entity_type.is_enemy else game.all_players
+        if entity_id == CHEST_ID:
+            _, x, y, previous_x, previous_y, health, random_class, random_stat = CHEST.unpack_from(data, offset)
+            offset += CHEST.size
+            entity = Chest.spawn((0, 0), game.stats, game.random, side, game.all_entities)
+            entity.random_class = PLAYABLE_TYPES[random_class]
+            entity.random_stat = random_stat
+        else:
+            (
+                _, x, y, previous_x, previous_y, health, attack_timer, animation_timer, sound_timer, frame, walking,
+            ) = UNIT.unpack_from(data, offset)
+            offset += UNIT.size
+            entity = entity_type.spawn((0, 0), game.stats, side, game.all_entities)
+            entity.time_since_last_attack = attack_timer
+            entity.animation_timer = animation_timer
+            entity.sound_timer = sound_timer
+            entity.image = entity.frames()[frame]
+            entity.walking = walking
+        entity.rect.topleft = (x, y)
+        entity.previous_topleft = (previous_x, previous_y)
+        entity.health = health
+        entity.health_bar_rect = Unit.health_bar_bg.get_rect(topleft=entity.rect.move(0, -10).topleft)
+
+    for notification in game.all_notifications:
+        notification.kill()
+    if state == GameState.States.GAME_SCREEN:
+        game.room_cleared_text.kill()
+    for _ in range(text_count):
+        kind, center_x, center_y, text_timer, timeout, length = TEXT.unpack_from(data, offset)
+        offset += TEXT.size
+        if kind == NOTIFICATION_TEXT:
+            text = TimedTextArea.spawn(
+                game.font,
+                data[offset:offset + length].decode(),
+                BLACK,
+                timeout,
+                game.all_notifications,
+                game.all_text,
+                center=(center_x, center_y),
+            )
+        else:
+            text = game.room_cleared_text
+            text.add(game.all_text)
+        offset += length
+        text.timer = text_timer
+
+    if state == GameState.States.GAME_SCREEN:
+        game.select_unit(PLAYABLE_TYPES[selected_unit])
+    else:
+        game.selected_unit = PLAYABLE_TYPES[selected_unit]
+    if game.dirty_renderer is not None:
+        game.dirty_renderer.invalidate()
+    game.random.setstate((version, tuple(words), gauss if has_gauss else None))
+
+
+def load_snapshot(data: bytes, **options) -> GameState:
+    # A new GameState restored from a snapshot, with the combat engine and flow fields on if the snapshot's
+    # game had them. options are passed on to GameState, e.g. dirty_rendering=True.
+    magic, use_combat_engine, use_flow_field = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a game snapshot")
+    screen_state = GameState.States(GAME.unpack_from(data, HEADER.size)[0])
+    game = GameState(screen_state, use_combat_engine=use_combat_engine, use_flow_field=use_flow_field, **options)
+    restore(game, data)
+    return game
+
+
+def main():
+    import headless  # Sets up the dummy video and audio drivers before pygame starts
+    from replay import checksum
+
+    parser = argparse.ArgumentParser(
+        description="Time snapshot() and restore() on a running game, and check that a restored branch plays out "
+        "like the original."
+    )
+    parser.add_argument("--units", default="2,2,1", help="starting Warriors,Rangers,Mages (default: 2,2,1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=300, help="steps played before the snapshot is taken")
+    parser.add_argument("--branch", type=int, default=2000, help="steps played after it by both branches")
+    parser.add_argument("--repeat", type=int, default=1000, help="snapshots and restores timed")
+    parser.add_argument("--engine", action="store_true", help="use the NumPy combat engine")
+    headless.add_flow_field_argument(parser)
+    args = parser.parse_args()
+
+    screen = headless.init_headless()
+
+    def new_session(seed: int) -> headless.Session:
+        return headless.Session(
+            headless.parse_units(args.units),
+            delta_time=SIMULATION_STEP,
+            seed=seed,
+            use_combat_engine=args.engine,
+            use_flow_field=args.flow_field,
+        )
+
+    session = new_session(args.seed)
+    for _ in range(args.warmup):
+        session.step(screen)
+    data = snapshot(session.game)
+    entities = len(session.game.all_entities)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        snapshot(session.game)
+    snapshot_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+    # The branch starts from a different seed, so only the restore can make it match
+    branch = new_session(args.seed + 1)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        restore(branch.game, data)
+    restore_us = (time.perf_counter() - start) / args.repeat * 1e6
+    round_trip = snapshot(branch.game) == data
+    branch.deploy_rng.setstate(session.deploy_rng.getstate())
+
+    for _ in range(args.branch):
+        session.step(screen)
+        branch.step(screen)
+    identical = snapshot(branch.game) == snapshot(session.game) and checksum(branch.game) == checksum(session.game)
+
+    print(json.dumps({
+        "entities": entities,
+        "bytes": len(data),
+        "snapshot_us": round(snapshot_us, 1),
+        "restore_us": round(restore_us, 1),
+        "round_trip": round_trip,
+        "branches_identical": identical,
+        "rooms_cleared": session.game.rooms_cleared,
+        "screen": session.game.screen_state.name,
+    }, indent=2))
+    pygame.quit()
+    sys.exit(0 if round_trip and identical else 1)
+
+
+if __name__ == "__main__":
+    main()
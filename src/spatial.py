@@ -0,0 +1,123 @@
+from pygame.sprite import Group, Sprite
+from typing import Callable
+
+
+class SpatialHash:
+    # Uniform grid over a sprite group, used as the broad phase for nearest-target and attack range queries.
+    # Sprites are bucketed by the cell their rect center falls in. rebuild() must be called whenever the
+    # sprites in the group have moved; sprites killed since the last rebuild are skipped by every query.
+    # Results always match a brute-force scan of the group, including which sprite wins a tie
+    # (the one that comes first in the group's iteration order).
+    def __init__(self, group: Group, cell_size: int = 128):
+        self.group = group
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[Sprite]] = {}
+        self.order: dict[Sprite, int] = {}
+        self.max_w = 0
+        self.max_h = 0
+        self.bounds = (0, 0, 0, 0)
+
+    def __bool__(self):
+        return bool(self.group)
+
+    def __len__(self):
+        return len(self.group)
+
+    def __iter__(self):
+        return iter(self.group)
+
+    def rebuild(self):
+        cell_size = self.cell_size
+        cells = self.cells
+        cells.clear()
+        self.order.clear()
+        self.max_w = self.max_h = 0
+        for i, sprite in enumerate(self.group):
+            self.order[sprite] = i
+            x, y = sprite.rect.center
+            key = (x // cell_size, y // cell_size)
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [sprite]
+            else:
+                bucket.append(sprite)
+            self.max_w = max(self.max_w, sprite.rect.w)
+            self.max_h = max(self.max_h, sprite.rect.h)
+
+        if cells:
+            xs = [key[0] for key in cells]
+            ys = [key[1] for key in cells]
+            self.bounds = (min(xs), min(ys), max(xs), max(ys))
+
+    def __ring(self, cx: int, cy: int, r: int):
+        cells = self.cells
+        if r == 0:
+            bucket = cells.get((cx, cy))
+            if bucket:
+                yield from bucket
+            return
+        for x in range(cx - r, cx + r + 1):
+            for y in (cy - r, cy + r):
+                bucket = cells.get((x, y))
+                if bucket:
+                    yield from bucket
+        for y in range(cy - r + 1, cy + r):
+            for x in (cx - r, cx + r):
+                bucket = cells.get((x, y))
+                if bucket:
+                    yield from bucket
+
+    def nearest(self, pos: tuple[int, int]) -> Sprite | None:
+        if not self.cells:
+            return None
+        x, y = pos
+        cell_size = self.cell_size
+        cx, cy = x // cell_size, y // cell_size
+        min_x, min_y, max_x, max_y = self.bounds
+        max_r = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        group = self.group
+        order = self.order
+
+        best = None
+        best_key = None
+        for r in range(max_r + 1):
+            for sprite in self.__ring(cx, cy, r):
+                if sprite not in group:
+                    continue
+                sx, sy = sprite.rect.center
+                key = ((sx - x) ** 2 + (sy - y) ** 2, order[sprite])
+                if best_key is None or key < best_key:
+                    best, best_key = sprite, key
+            # Everything in ring r + 1 and beyond is further than r * cell_size away
+            if best_key is not None and best_key[0] <= (r * cell_size) ** 2:
+                break
+        return best
+
+    def __candidates(self, sprite: Sprite, reach: int) -> list[Sprite]:
+        cell_size = self.cell_size
+        x, y = sprite.rect.center
+        group = self.group
+        found = []
+        for cx in range((x - reach) // cell_size, (x + reach) // cell_size + 1):
+            for cy in range((y - reach) // cell_size, (y + reach) // cell_size + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.extend(s for s in bucket if s in group)
+        return found
+
+    def __reach(self, sprite: Sprite) -> int:
+        # Furthest center-to-center distance (per axis) at which sprite can touch or reach anything in the grid
+        rect = sprite.rect
+        overlap = max(rect.w + self.max_w, rect.h + self.max_h) // 2 + 1
+        return max(overlap, int(getattr(sprite, "attack_distance", 0)) + 1)
+
+    def collide(self, sprite: Sprite, collided: Callable[[Sprite, Sprite], bool]) -> list[Sprite]:
+        # Equivalent to pygame.sprite.spritecollide(sprite, group, False, collided)
+        hits = [s for s in self.__candidates(sprite, self.__reach(sprite)) if collided(sprite, s)]
+        hits.sort(key=self.order.__getitem__)
+        return hits
+
+    def collide_any(self, sprite: Sprite, collided: Callable[[Sprite, Sprite], bool]) -> Sprite | None:
+        # Equivalent to pygame.sprite.spritecollideany(sprite, group, collided)
+        hits = self.collide(sprite, collided)
+        return hits[0] if hits else None
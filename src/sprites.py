@@ -1,13 +1,23 @@
 import random
-import pygame
-from pygame import image, Surface, Rect
+from pygame import Surface, Rect
 from pygame.font import Font
 from pygame.math import Vector2
-from pygame.sprite import Group, Sprite
-from pygame.transform import smoothscale, flip
+from pygame.sprite import Sprite
 from typing import Any, Callable
 
+from assets import registry, text_cache
 from consts import *
+from pools import PooledSprite
+from spatial import SpatialHash
+from events import SHOW_NOTIFICATION
+from stats import StatTable
+
+# Sizes the art is scaled to, and the animation frames of each unit class in Unit.frames() order
+UNIT_IMAGE_SIZE = (64, 64)
+UNIT_FRAME_NAMES = ["standing", "attacking", "walking_1", "walking_2"]
+HEALTH_BAR_SIZE = (64, 6)
+CHEST_IMAGE_SIZE = (64, 44)
+ARROW_IMAGE_SIZE = (51, 20)
 
 
 def attack_2_to_1(scale: int) -> int:
@@ -18,13 +28,53 @@ def attack_3_to_2(scale: int) -> int:
     return 1000 // scale + 2000
 
 
-class Unit(Sprite):
+def interpolated_offset(entity, alpha: float) -> tuple[int, int]:
+    # How far to shift an entity when drawing it so it sits alpha of the way from where it was
+    # before the last simulation tick to where it is now
+    x, y = entity.previous_topleft
+    return round((x - entity.rect.x) * (1 - alpha)), round((y - entity.rect.y) * (1 - alpha))
+
+
+# Source rects of partly filled health bars by health ratio, shared since all bar images are the same size
+health_bar_areas: dict[float, Rect] = {}
+
+
+def health_bar_area(ratio: float) -> Rect:
+    area = health_bar_areas.get(ratio)
+    if area is None:
+        area = health_bar_areas[ratio] = Unit.health_bar_bg.get_rect(w=Unit.health_bar_bg.get_width() * ratio)
+    return area
+
+
+def load_health_bars():
+    Unit.health_bar_bg = registry.image("health_bar/background.png", HEALTH_BAR_SIZE, alpha=False)
+    Unit.health_bar_fg_green = registry.image("health_bar/green.png", HEALTH_BAR_SIZE, alpha=False)
+    Unit.health_bar_fg_red = registry.image("health_bar/red.png", HEALTH_BAR_SIZE, alpha=False)
+
+
+class Unit(PooledSprite):
+    # Units are created with the StatTable of their game, e.g. Warrior.spawn(pos, game.stats, group).
+    # The base_ stats declared on the classes are only the starting values each game's table is built from.
+    # Images are shared by every unit of a class and set on it by load_unit_images(); what changes during a
+    # unit's life is kept in slots.
+    __slots__ = (
+        "stats",
+        "health",
+        "time_since_last_attack",
+        "walking",
+        "animation_timer",
+        "sound_timer",
+        "image",
+        "rect",
+        "previous_topleft",
+        "health_bar_rect",
+    )
     asset_dir_name = None
-    health = 0
-    attack = 0
-    speed = 0
+    base_health = 0
+    base_attack = 0
+    base_speed = 0
     attack_speed = None
-    attack_speed_scale = 1
+    base_attack_speed_scale = 1
     attack_distance = 0
     aoe_attack = 0
     health_bar_bg = None
@@ -34,79 +84,67 @@ class Unit(Sprite):
     footsteps = []
     attack_sounds = []
     damage_sounds = []
+    standing_surf = None
+    attacking_surf = None
+    walking_1_surf = None
+    walking_2_surf = None
+    health_bar_surf = None
 
     def __init__(
         self,
         centerpos: tuple[int, int],
+        stats: StatTable,
         *groups,
     ):
-        super().__init__(*groups)
-
-        # Stats
-        self.health = type(self).health
-        self.time_since_last_attack = 0
-
-        # For animations
-        self.walking = False
-        self.animation_timer = 0
-
-        # Surfaces
-        self.standing_surf = smoothscale(
-            image.load(ASSETS_DIR / type(self).asset_dir_name / "standing.png").convert_alpha(),
-            (64, 64),
-        )
-        self.attacking_surf = smoothscale(
-            image.load(
-                ASSETS_DIR / type(self).asset_dir_name / "attacking.png"
-            ).convert_alpha(),
-            (64, 64),
-        )
-        self.walking_1_surf = smoothscale(
-            image.load(
-                ASSETS_DIR / type(self).asset_dir_name / "walking_1.png"
-            ).convert_alpha(),
-            (64, 64),
-        )
-        self.walking_2_surf = smoothscale(
-            image.load(
-                ASSETS_DIR / type(self).asset_dir_name / "walking_2.png"
-            ).convert_alpha(),
-            (64, 64),
-        )
+        super().__init__()
 
         if Unit.health_bar_bg is None:
-            Unit.health_bar_bg = smoothscale(image.load(ASSETS_DIR / "health_bar" / "background.png").convert(), (64, 6))
-            Unit.health_bar_fg_green = smoothscale(image.load(ASSETS_DIR / "health_bar" / "green.png").convert(), (64, 6))
-            Unit.health_bar_fg_red = smoothscale(image.load(ASSETS_DIR / "health_bar" / "red.png").convert(), (64, 6))
+            load_health_bars()
+
+        if type(self).standing_surf is None:
+            load_unit_images(type(self))
 
         if not Unit.footsteps:
-            for path in (ASSETS_DIR / "sounds" / "footsteps").glob("*.ogg"):
-                sound = pygame.mixer.Sound(path)
-                sound.set_volume(0.5)
-                Unit.footsteps.append(sound)
-        self.sound_timer = 1000
+            Unit.footsteps = registry.sound_dir("sounds/footsteps", 0.5)
 
         if not type(self).attack_sounds:
-            for path in (ASSETS_DIR / "sounds" / "attack" / type(self).asset_dir_name).glob("*.ogg"):
-                sound = pygame.mixer.Sound(path)
-                sound.set_volume(0.3)
-                type(self).attack_sounds.append(sound)
+            type(self).attack_sounds = registry.sound_dir(f"sounds/attack/{type(self).asset_dir_name}", 0.3)
 
         if not type(self).damage_sounds:
-            for path in (ASSETS_DIR / "sounds" / "damage" / type(self).asset_dir_name).glob("*.ogg"):
-                sound = pygame.mixer.Sound(path)
-                sound.set_volume(0.3)
-                type(self).damage_sounds.append(sound)
+            type(self).damage_sounds = registry.sound_dir(f"sounds/damage/{type(self).asset_dir_name}", 0.3)
+
+        self.reset(centerpos, stats, *groups)
+
+    def reset(self, centerpos: tuple[int, int], stats: StatTable, *groups):
+        # Everything that differs between one life of a unit and the next, so pooled units can be reused
+        # Stats
+        self.stats = stats[type(self)]
+        self.health = self.stats.health
+        self.time_since_last_attack = 0
+
+        # For animations
+        self.walking = False
+        self.animation_timer = 0
+        self.sound_timer = 1000
 
         # The surface that should be currently drawn
         self.image = self.standing_surf
         self.rect = self.image.get_rect(center=centerpos)
-        self.health_bar_surf = Unit.health_bar_fg_red if type(self).is_enemy else Unit.health_bar_fg_green
+        # Position before the last simulation tick, for drawing in between ticks
+        self.previous_topleft = self.rect.topleft
         self.health_bar_rect = self.health_bar_bg.get_rect(topleft=self.rect.move(0, -10).topleft)
+        self.add(*groups)
 
     def __repr__(self):
-        attack_speed = type(self).attack_speed(self.attack_speed_scale)
-        return f"{self.__class__.__name__}(pos={self.rect.center}, {self.health=}, {self.attack=}, {self.speed=}, self.attack_speed={attack_speed})"
+        stats = self.stats
+        return f"{self.__class__.__name__}(pos={self.rect.center}, {self.health=}, {stats.attack=}, {stats.speed=}, {stats.attack_delay=})"
+
+    @property
+    def max_health(self) -> int:
+        return self.stats.health
+
+    def frames(self) -> list[Surface]:
+        return [self.standing_surf, self.attacking_surf, self.walking_1_surf, self.walking_2_surf]
 
     def __set_surf(self):
         if self.walking:
@@ -125,23 +163,30 @@ class Unit(Sprite):
         else:
             self.image = self.standing_surf
 
-    def update(self, game, screen_rect, group, delta_time):
+    def update(self, game, screen_rect, grid, delta_time, field=None):
         self.time_since_last_attack += delta_time
         self.animation_timer += delta_time
         self.sound_timer += delta_time
         self.__set_surf()
-        self.move_nearest_ip(group)
+        self.move_nearest_ip(grid, field)
         self.rect.clamp_ip(screen_rect)
         self.health_bar_rect = self.health_bar_bg.get_rect(topleft=self.rect.move(0, -10).topleft)
-        self.do_attack(game, group)
+        self.do_attack(game, grid)
         if not game.muted and self.walking and self.sound_timer > 500:
-            random.choice(Unit.footsteps).play()
+            game.audio.play("footsteps", game.random.choice(Unit.footsteps))
             self.sound_timer = 0
 
-    def draw(self, screen):
-        screen.blit(self.image, self.rect)
-        screen.blit(self.health_bar_bg, self.health_bar_rect)
-        screen.blit(self.health_bar_surf, self.health_bar_rect, self.health_bar_surf.get_rect(w=self.health_bar_surf.get_width() * (self.health / type(self).health)))
+    def blits(self, offset: tuple[int, int] = (0, 0)) -> list[tuple]:
+        # Sprite, health bar background and health bar fill, in Surface.blits() form
+        health_bar_rect = self.health_bar_rect.move(offset)
+        return [
+            (self.image, self.rect.move(offset)),
+            (self.health_bar_bg, health_bar_rect),
+            (self.health_bar_surf, health_bar_rect, health_bar_area(self.health / self.stats.health)),
+        ]
+
+    def draw(self, screen, offset: tuple[int, int] = (0, 0)):
+        screen.blits(self.blits(offset), doreturn=False)
 
 
     @staticmethod
@@ -151,187 +196,154 @@ class Unit(Sprite):
         other_pos = Vector2(other.rect.center)
         return is_colliding or me_pos.distance_to(other_pos) < me.attack_distance
 
-    def move_nearest_ip(self, group: Group):
-        if group and self.image != self.attacking_surf:
+    def move_nearest_ip(self, grid: SpatialHash, field=None):
+        # Walks toward the nearest opponent: the one the flow field picks when there is one, else the
+        # nearest found by the spatial hash. Opponents killed earlier in the tick are still in the field until its next update.
+        if grid and self.image != self.attacking_surf:
             cur_pos = Vector2(self.rect.center)
-            nearest = min(
-                [e for e in group],
-                key=lambda e: cur_pos.distance_to(Vector2(e.rect.center)),
-            )
+            nearest = field.target(self.rect.center) if field is not None else None
+            if nearest is None or nearest not in grid.group:
+                nearest = grid.nearest(self.rect.center)
             nearest_pos = Vector2(nearest.rect.center)
             dist = nearest_pos - cur_pos
             if dist:
-                vec = dist.normalize() * self.speed
-                if not pygame.sprite.spritecollideany(self, group, self.__collided):
+                vec = dist.normalize() * self.stats.speed
+                if not grid.collide_any(self, self.__collided):
                     self.rect.move_ip(vec)
                     self.walking = True
                     return
         self.walking = False
 
-    def do_attack(self, game, group: Group):
-        if self.time_since_last_attack >= type(self).attack_speed(self.attack_speed_scale):
-            attacked = pygame.sprite.spritecollide(self, group, False, self.__collided)
+    def do_attack(self, game, grid: SpatialHash):
+        if self.time_since_last_attack >= self.stats.attack_delay:
+            attacked = grid.collide(self, self.__collided)
             if attacked:
                 self.image = self.attacking_surf
                 self.animation_timer = 0
                 for entity in attacked:
-                    entity.health -= self.attack
+                    entity.health -= self.stats.attack
                     if not game.muted and type(entity) is not Chest:
-                        random.choice(type(entity).damage_sounds).play()
+                        game.audio.play("damage", game.random.choice(type(entity).damage_sounds))
                     if entity.health <= 0:
                         entity.kill()
                     if not self.aoe_attack:
                         break
                 if not game.muted:
-                    random.choice(type(self).attack_sounds).play()
+                    game.audio.play("attack", game.random.choice(type(self).attack_sounds))
                 self.time_since_last_attack = 0
 
 
 class Warrior(Unit):
     asset_dir_name = "knight"
-    health = 5
-    attack = 2
-    speed = 5
+    base_health = 5
+    base_attack = 2
+    base_speed = 5
     attack_speed = attack_2_to_1
     attack_sounds = []
     damage_sounds = []
 
-    def __init__(self, centerpos: tuple[int, int], *groups):
-        super().__init__(centerpos, *groups)
-
-    @classmethod
-    def reset_stats(cls):
-        cls.health = 5
-        cls.attack = 2
-        cls.speed = 5
-        cls.attack_speed_scale = 1
+    def __init__(self, centerpos: tuple[int, int], stats: StatTable, *groups):
+        super().__init__(centerpos, stats, *groups)
 
 
 class Ranger(Unit):
     asset_dir_name = "ranger"
-    health = 3
-    attack = 3
-    speed = 6
+    base_health = 3
+    base_attack = 3
+    base_speed = 6
     attack_speed = attack_2_to_1
     attack_distance = 200
     attack_sounds = []
     damage_sounds = []
 
-    def __init__(self, centerpos: tuple[int, int], *groups):
-        super().__init__(centerpos, *groups)
-
-    @classmethod
-    def reset_stats(cls):
-        cls.health = 3
-        cls.attack = 3
-        cls.speed = 6
-        cls.attack_speed_scale = 1
+    def __init__(self, centerpos: tuple[int, int], stats: StatTable, *groups):
+        super().__init__(centerpos, stats, *groups)
 
 
 class Mage(Unit):
     asset_dir_name = "mage"
-    health = 1
-    attack = 5
-    speed = 4
+    base_health = 1
+    base_attack = 5
+    base_speed = 4
     attack_speed = attack_3_to_2
     attack_distance = 300
     aoe_attack = True
     attack_sounds = []
     damage_sounds = []
 
-    def __init__(self, centerpos: tuple[int, int], *groups):
-        super().__init__(centerpos, *groups)
-
-    @classmethod
-    def reset_stats(cls):
-        cls.health = 1
-        cls.attack = 5
-        cls.speed = 4
-        cls.attack_speed_scale = 1
+    def __init__(self, centerpos: tuple[int, int], stats: StatTable, *groups):
+        super().__init__(centerpos, stats, *groups)
 
 
 class Skeleton(Unit):
     asset_dir_name = "skeleton"
-    health = 3
-    attack = 1
-    speed = 3
+    base_health = 3
+    base_attack = 1
+    base_speed = 3
     attack_speed = attack_2_to_1
     is_enemy = True
     attack_sounds = []
     damage_sounds = []
 
-    def __init__(self, centerpos: tuple[int, int], *groups):
-        super().__init__(centerpos, *groups)
-
-    @classmethod
-    def reset_stats(cls):
-        cls.health = 3
-        cls.attack = 1
-        cls.speed = 3
-        cls.attack_speed_scale = 1
+    def __init__(self, centerpos: tuple[int, int], stats: StatTable, *groups):
+        super().__init__(centerpos, stats, *groups)
 
 
 class Zombie(Unit):
     asset_dir_name = "zombie"
-    health = 2
-    attack = 2
-    speed = 2
+    base_health = 2
+    base_attack = 2
+    base_speed = 2
     attack_speed = attack_2_to_1
     is_enemy = True
     attack_sounds = []
     damage_sounds = []
 
-    def __init__(self, centerpos: tuple[int, int], *groups):
-        super().__init__(centerpos,  *groups)
-
-    @classmethod
-    def reset_stats(cls):
-        cls.health = 2
-        cls.attack = 2
-        cls.speed = 2
-        cls.attack_speed_scale = 1
+    def __init__(self, centerpos: tuple[int, int], stats: StatTable, *groups):
+        super().__init__(centerpos, stats, *groups)
 
 
-class Chest(Sprite):
+class Chest(PooledSprite):
+    # Opening a chest upgrades one random stat of one random party class in the game's StatTable, and
+    # shows which through the events of the table
     health = 10
+    max_health = 10
 
-    def __init__(self, centerpos, *groups):
+    def __init__(self, centerpos, stats: StatTable, rng: random.Random, *groups):
         super().__init__(*groups)
+        self.stats = stats
         self.health = 10
-        self.image = smoothscale(image.load(ASSETS_DIR / "chest.png").convert_alpha(), (64, 44))
+        self.image = registry.image("chest.png", CHEST_IMAGE_SIZE)
         self.rect = self.image.get_rect(center=centerpos)
+        self.previous_topleft = self.rect.topleft
 
         if Unit.health_bar_bg is None:
-            Unit.health_bar_bg = smoothscale(image.load(ASSETS_DIR / "health_bar" / "background.png").convert(), (64, 6))
-            Unit.health_bar_fg_green = smoothscale(image.load(ASSETS_DIR / "health_bar" / "green.png").convert(), (64, 6))
-            Unit.health_bar_fg_red = smoothscale(image.load(ASSETS_DIR / "health_bar" / "red.png").convert(), (64, 6))
+            load_health_bars()
 
         self.health_bar_surf = Unit.health_bar_fg_red
         self.health_bar_rect = Unit.health_bar_bg.get_rect(topleft=self.rect.move(0, -10).topleft)
 
-        self.random_class = random.choice([Warrior, Ranger, Mage])
-        self.random_stat = random.randint(0, 3)
+        self.random_class = rng.choice([Warrior, Ranger, Mage])
+        self.random_stat = rng.randint(0, 3)
 
-    def update(self, game, screen_rect, group, delta_time):
+    def update(self, game, screen_rect, grid, delta_time, field=None):
         self.rect.clamp_ip(screen_rect)
         self.health_bar_rect = Unit.health_bar_bg.get_rect(topleft=self.rect.move(0, -10).topleft)
 
-    def draw(self, screen):
-        screen.blit(self.image, self.rect)
-        screen.blit(Unit.health_bar_bg, self.health_bar_rect)
-        screen.blit(self.health_bar_surf, self.health_bar_rect, self.health_bar_surf.get_rect(
-            w=self.health_bar_surf.get_width() * (self.health / type(self).health)))
+    def blits(self, offset: tuple[int, int] = (0, 0)) -> list[tuple]:
+        health_bar_rect = self.health_bar_rect.move(offset)
+        return [
+            (self.image, self.rect.move(offset)),
+            (Unit.health_bar_bg, health_bar_rect),
+            (self.health_bar_surf, health_bar_rect, health_bar_area(self.health / self.max_health)),
+        ]
+
+    def draw(self, screen, offset: tuple[int, int] = (0, 0)):
+        screen.blits(self.blits(offset), doreturn=False)
 
     def kill(self):
-        if self.random_stat == 0:
-            self.random_class.health += 1
-        elif self.random_stat == 1:
-            self.random_class.attack += 1
-        elif self.random_stat == 2:
-            self.random_class.speed += 1
-        elif self.random_stat == 3:
-            self.random_class.attack_speed_scale += 1
-        pygame.event.post(pygame.event.Event(SHOW_NOTIFICATION, text=f"Upgraded {self.random_class.__name__}'s {NUMBER_TO_STAT_NAME[self.random_stat]}"))
+        self.stats.upgrade(self.random_class, self.random_stat)
+        self.stats.events.publish(SHOW_NOTIFICATION, text=f"Upgraded {self.random_class.__name__}'s {NUMBER_TO_STAT_NAME[self.random_stat]}")
         super().kill()
 
 
@@ -351,6 +363,7 @@ class TextArea(Sprite):
         super().__init__(*groups)
         self.font = font
         self.color = color
+        self.text: str | None = None
         self.image: Surface | None = None
         self.rect: Rect | None = None
         self.pos = pos
@@ -359,14 +372,22 @@ class TextArea(Sprite):
     def set_text(self, text: str, color: tuple[int, int, int] | None = None):
         if color is not None:
             self.color = color
-        self.image = self.font.render(text, True, self.color)
-        self.rect = self.image.get_rect(**self.pos)
+        elif text == self.text:
+            return
+        self.text = text
+        self.__render()
 
     def set_color(self, color):
-        self.color = color
+        if color != self.color:
+            self.color = color
+            self.__render()
 
+    def __render(self):
+        self.image = text_cache.render(self.font, self.text, self.color)
+        self.rect = self.image.get_rect(**self.pos)
 
-class TimedTextArea(TextArea):
+
+class TimedTextArea(TextArea, PooledSprite):
     def __init__(
             self,
             font: Font,
@@ -406,7 +427,8 @@ class UpdatableTextArea(TextArea):
         super().__init__(font, text_callback(), color, *groups, **pos)
         self.text_callback = text_callback
 
-    def update(self, game, delta_time):
+    def refresh(self, *_, **__):
+        # Takes any arguments so it can be subscribed directly to an EventBus topic
         self.set_text(self.text_callback())
 
 
@@ -415,11 +437,8 @@ class TitleScreenArrow(Sprite):
         super().__init__(*groups)
         self.arrow_type = arrow_type
         self.class_type = class_type
-        self.image = smoothscale(image.load(ASSETS_DIR / "title_screen" / "arrow.png").convert_alpha(), (51, 20))
-        if arrow_type == -1:
-            self.image = flip(self.image, True, False)
-        self.sound = pygame.mixer.Sound(ASSETS_DIR / "sounds" / "button" / ("arrow_down.ogg" if self.arrow_type == -1 else "arrow_up.ogg"))
-        self.sound.set_volume(0.5)
+        self.image = registry.image("title_screen/arrow.png", ARROW_IMAGE_SIZE, flip_x=arrow_type == -1)
+        self.sound = registry.sound(f"sounds/button/{'arrow_down.ogg' if self.arrow_type == -1 else 'arrow_up.ogg'}", 0.5)
         self.rect = self.image.get_rect(**pos)
 
     def handle_click(self, game):
@@ -429,16 +448,73 @@ class TitleScreenArrow(Sprite):
             return
         game.playable_units[self.class_type] += self.arrow_type
         if not game.muted:
-            self.sound.play()
+            game.audio.play("ui", self.sound)
 
 
 class Button(Sprite):
-    def __init__(self, button_size: tuple[int, int], image_path: Path, handle_click_func: Callable[[], Any], *groups, **pos):
+    def __init__(self, button_size: tuple[int, int], image_path: str | Path, handle_click_func: Callable[[], Any], *groups, **pos):
         super().__init__(*groups)
 
-        self.image = smoothscale(image.load(image_path).convert_alpha(), button_size)
+        self.image = registry.image(image_path, button_size)
         self.rect = self.image.get_rect(**pos)
         self.click_func = handle_click_func
 
     def handle_click(self, _):
         self.click_func()
+
+
+def new_stat_table(events=None) -> StatTable:
+    return StatTable([Warrior, Ranger, Mage, Skeleton, Zombie], events)
+
+
+def load_unit_images(unit_type: type[Unit]):
+    for name in UNIT_FRAME_NAMES:
+        setattr(unit_type, f"{name}_surf", registry.image(f"{unit_type.asset_dir_name}/{name}.png", UNIT_IMAGE_SIZE))
+    if Unit.health_bar_bg is None:
+        load_health_bars()
+    unit_type.health_bar_surf = Unit.health_bar_fg_red if unit_type.is_enemy else Unit.health_bar_fg_green
+
+
+def load_unit_sounds(unit_type: type[Unit]):
+    unit_type.attack_sounds = registry.sound_dir(f"sounds/attack/{unit_type.asset_dir_name}", 0.3)
+    unit_type.damage_sounds = registry.sound_dir(f"sounds/damage/{unit_type.asset_dir_name}", 0.3)
+
+
+def load_footsteps():
+    Unit.footsteps = registry.sound_dir("sounds/footsteps", 0.5)
+
+
+def load_widgets():
+    registry.image("chest.png", CHEST_IMAGE_SIZE)
+    registry.image("title_screen/arrow.png", ARROW_IMAGE_SIZE)
+    registry.image("title_screen/arrow.png", ARROW_IMAGE_SIZE, flip_x=True)
+    registry.sound("sounds/button/arrow_down.ogg", 0.5)
+    registry.sound("sounds/button/arrow_up.ogg", 0.5)
+
+
+def image_variants() -> list[tuple]:
+    # The scaled and flipped images the loaders above ask the registry for, as image() arguments
+    # (path, size, flip_x, alpha), so src/bake.py can pre-render them without loading the game
+    variants = [(f"health_bar/{name}.png", HEALTH_BAR_SIZE, False, False) for name in ["background", "green", "red"]]
+    for unit_type in [Warrior, Ranger, Mage, Skeleton, Zombie]:
+        variants += [(f"{unit_type.asset_dir_name}/{name}.png", UNIT_IMAGE_SIZE, False, True) for name in UNIT_FRAME_NAMES]
+    variants.append(("chest.png", CHEST_IMAGE_SIZE, False, True))
+    variants.append(("title_screen/arrow.png", ARROW_IMAGE_SIZE, False, True))
+    variants.append(("title_screen/arrow.png", ARROW_IMAGE_SIZE, True, True))
+    return variants
+
+
+def asset_loaders() -> list[Callable[[], Any]]:
+    # preload_assets() as separate steps, so a BackgroundLoader can report progress between them
+    loaders = [load_health_bars, load_footsteps]
+    for unit_type in [Warrior, Ranger, Mage, Skeleton, Zombie]:
+        loaders.append(lambda unit_type=unit_type: load_unit_images(unit_type))
+        loaders.append(lambda unit_type=unit_type: load_unit_sounds(unit_type))
+    loaders.append(load_widgets)
+    return loaders
+
+
+def preload_assets():
+    # Loads everything the sprites above use so the first spawn of each class doesn't hit the disk
+    for load in asset_loaders():
+        load()
@@ -0,0 +1,57 @@
+from consts import *
+from events import EventBus, STAT_CHANGED
+
+
+class UnitStats:
+    # Current stats of one unit class in one game. Every unit of the class holds a reference to it,
+    # so upgrades apply to units already on the field, and reading a stat is a single attribute lookup.
+    # attack_delay is the attack speed in ms between attacks, kept up to date with attack_speed_scale.
+    __slots__ = ("unit_type", "health", "attack", "speed", "attack_speed_scale", "attack_delay")
+
+    def __init__(self, unit_type: type):
+        self.unit_type = unit_type
+
+
+class StatTable:
+    # The unit stats of one game session, so several GameStates can run in one process without
+    # changing each other's units. Starts from (and reset() returns to) the base_ stats declared on
+    # each unit class. Changes are published as STAT_CHANGED on the given bus.
+    # Examples: stats[Warrior].speed
+    #           stats.upgrade(Skeleton, 2)
+    def __init__(self, unit_types: list[type], events: EventBus | None = None):
+        self.events = events if events is not None else EventBus()
+        self.table = {unit_type: UnitStats(unit_type) for unit_type in unit_types}
+        for unit_type in unit_types:
+            for stat in NUMBER_TO_STAT_ATTRIBUTE:
+                setattr(self.table[unit_type], stat, getattr(unit_type, f"base_{stat}"))
+            self.table[unit_type].attack_delay = unit_type.attack_speed(unit_type.base_attack_speed_scale)
+
+    def __getitem__(self, unit_type: type) -> UnitStats:
+        return self.table[unit_type]
+
+    def __iter__(self):
+        return iter(self.table.values())
+
+    def set(self, unit_type: type, stat: str, value: int):
+        stats = self.table[unit_type]
+        if getattr(stats, stat) != value:
+            setattr(stats, stat, value)
+            if stat == "attack_speed_scale":
+                stats.attack_delay = unit_type.attack_speed(value)
+            self.events.publish(STAT_CHANGED, unit_type=unit_type, stat=stat, value=value)
+
+    def upgrade(self, unit_type: type, stat_number: int):
+        # stat_number indexes NUMBER_TO_STAT_ATTRIBUTE
+        stat = NUMBER_TO_STAT_ATTRIBUTE[stat_number]
+        self.set(unit_type, stat, getattr(self.table[unit_type], stat) + 1)
+
+    def reset(self):
+        for unit_type in self.table:
+            for stat in NUMBER_TO_STAT_ATTRIBUTE:
+                self.set(unit_type, stat, getattr(unit_type, f"base_{stat}"))
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        return {
+            unit_type.__name__: {stat: getattr(stats, stat) for stat in NUMBER_TO_STAT_ATTRIBUTE}
+            for unit_type, stats in self.table.items()
+        }